@@ -0,0 +1,230 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from uuid import uuid4
+
+import numpy as np
+from langchain_core.documents import Document
+from qdrant_client.http.models import (
+    Distance, FieldCondition, Filter, MatchValue, OrderBy, PointIdsList, PointStruct, Range, VectorParams,
+)
+
+# off | local | qdrant  (qdrant lets several replicas share one cache). Off by default: a
+# near-duplicate (e.g. negated) question can be served another question's answer.
+ANSWER_CACHE_BACKEND = os.getenv("ANSWER_CACHE_BACKEND", "off").lower()
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", str(24 * 3600)))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "5000"))
+ANSWER_CACHE_COLLECTION = os.getenv("ANSWER_CACHE_COLLECTION", "ncert-answer-cache")
+
+
+def serialize_docs(docs: list) -> list[dict]:
+    return [{"page_content": d.page_content, "metadata": d.metadata} for d in docs]
+
+
+def deserialize_docs(docs: list[dict]) -> list[Document]:
+    return [Document(page_content=d["page_content"], metadata=d.get("metadata", {})) for d in docs]
+
+
+class LocalAnswerCache:
+    """
+    In-process semantic answer cache. An answer is reused when a new query for the same cid
+    has cosine similarity >= threshold with a cached query. Entries expire after `ttl`
+    seconds and the least recently used ones are evicted beyond `max_entries`.
+    Single worker only: invalidate() clears this process's entries, so after a chapter is
+    re-upserted other workers keep serving old answers until their TTL runs out. Use the
+    qdrant backend with several workers or replicas.
+    """
+
+    def __init__(self, threshold: float = ANSWER_CACHE_THRESHOLD, ttl: int = ANSWER_CACHE_TTL,
+                 max_entries: int = ANSWER_CACHE_MAX_ENTRIES):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._by_cid = {}
+        self._lru = OrderedDict()  # entry id -> cid
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _drop(self, entry_id, cid):
+        self._lru.pop(entry_id, None)
+        entries = self._by_cid.get(cid)
+        if entries is not None:
+            entries.pop(entry_id, None)
+            if not entries:
+                del self._by_cid[cid]
+
+    def lookup(self, cid: str, vector) -> Optional[tuple[str, list[Document]]]:
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        now = time.time()
+        with self._lock:
+            entries = self._by_cid.get(cid, {})
+            for entry_id in [e for e, entry in entries.items() if entry["expires_at"] <= now]:
+                self._drop(entry_id, cid)
+            entries = self._by_cid.get(cid)
+            if not entries:
+                self.misses += 1
+                return None
+
+            ids = list(entries)
+            scores = np.stack([entries[e]["vector"] for e in ids]) @ query
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            entry = entries[ids[best]]
+            self._lru.move_to_end(ids[best])
+            self.hits += 1
+            return entry["answer"], deserialize_docs(entry["docs"])
+
+    def store(self, cid: str, vector, answer: str, docs: list):
+        vector = np.asarray(vector, dtype=np.float32)
+        vector = vector / (np.linalg.norm(vector) or 1.0)
+        entry_id = uuid4().hex
+        with self._lock:
+            self._by_cid.setdefault(cid, {})[entry_id] = {
+                "vector": vector,
+                "answer": answer,
+                "docs": serialize_docs(docs),
+                "expires_at": time.time() + self.ttl,
+            }
+            self._lru[entry_id] = cid
+            while len(self._lru) > self.max_entries:
+                old_id, old_cid = next(iter(self._lru.items()))
+                self._drop(old_id, old_cid)
+
+    def invalidate(self, cid: str):
+        # this process only (see the class docstring)
+        with self._lock:
+            for entry_id in list(self._by_cid.get(cid, {})):
+                self._drop(entry_id, cid)
+
+    async def alookup(self, cid: str, vector):
+        return self.lookup(cid, vector)
+
+    async def astore(self, cid: str, vector, answer: str, docs: list):
+        self.store(cid, vector, answer, docs)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"backend": "local", "entries": len(self._lru), "hits": self.hits, "misses": self.misses}
+
+
+class QdrantAnswerCache:
+    """
+    Same contract as LocalAnswerCache, backed by a Qdrant collection so all replicas share it.
+    Expiry is a payload range filter; size is enforced by deleting the oldest points
+    every `prune_every` stores.
+    """
+
+    def __init__(self, client, dim: int = 384, threshold: float = ANSWER_CACHE_THRESHOLD,
+                 ttl: int = ANSWER_CACHE_TTL, max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+                 collection_name: str = ANSWER_CACHE_COLLECTION, prune_every: int = 50):
+        self.client = client
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.collection_name = collection_name
+        self.prune_every = prune_every
+        self._stores = 0
+        self.hits = 0
+        self.misses = 0
+
+        if not client.collection_exists(collection_name):
+            client.create_collection(
+                collection_name=collection_name,
+                vectors_config=VectorParams(size=dim, distance=Distance.COSINE),
+            )
+            client.create_payload_index(collection_name, field_name="cid", field_schema="keyword")
+            client.create_payload_index(collection_name, field_name="created_at", field_schema="float")
+            client.create_payload_index(collection_name, field_name="expires_at", field_schema="float")
+
+    def lookup(self, cid: str, vector) -> Optional[tuple[str, list[Document]]]:
+        response = self.client.query_points(
+            collection_name=self.collection_name,
+            query=list(vector),
+            query_filter=Filter(must=[
+                FieldCondition(key="cid", match=MatchValue(value=cid)),
+                FieldCondition(key="expires_at", range=Range(gt=time.time())),
+            ]),
+            limit=1,
+            score_threshold=self.threshold,
+            with_payload=True,
+        )
+        if not response.points:
+            self.misses += 1
+            return None
+        self.hits += 1
+        payload = response.points[0].payload
+        return payload["answer"], deserialize_docs(payload["docs"])
+
+    def store(self, cid: str, vector, answer: str, docs: list):
+        now = time.time()
+        self.client.upsert(
+            collection_name=self.collection_name,
+            points=[PointStruct(
+                id=str(uuid4()),
+                vector=list(vector),
+                payload={
+                    "cid": cid,
+                    "answer": answer,
+                    "docs": serialize_docs(docs),
+                    "created_at": now,
+                    "expires_at": now + self.ttl,
+                },
+            )],
+            wait=False,
+        )
+        self._stores += 1
+        if self._stores % self.prune_every == 0:
+            self.prune()
+
+    def prune(self):
+        self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=Filter(must=[FieldCondition(key="expires_at", range=Range(lte=time.time()))]),
+        )
+        overflow = self.client.count(self.collection_name, exact=True).count - self.max_entries
+        if overflow > 0:
+            oldest, _ = self.client.scroll(
+                collection_name=self.collection_name,
+                limit=overflow,
+                order_by=OrderBy(key="created_at"),
+                with_payload=False,
+            )
+            self.client.delete(
+                collection_name=self.collection_name,
+                points_selector=PointIdsList(points=[p.id for p in oldest]),
+            )
+
+    def invalidate(self, cid: str):
+        self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=Filter(must=[FieldCondition(key="cid", match=MatchValue(value=cid))]),
+        )
+
+    async def alookup(self, cid: str, vector):
+        return await asyncio.to_thread(self.lookup, cid, vector)
+
+    async def astore(self, cid: str, vector, answer: str, docs: list):
+        await asyncio.to_thread(self.store, cid, vector, answer, docs)
+
+    def stats(self) -> dict:
+        return {"backend": "qdrant", "collection": self.collection_name, "hits": self.hits, "misses": self.misses}
+
+
+def create_answer_cache(get_client, dim: int = 384):
+    if ANSWER_CACHE_BACKEND == "local":
+        if int(os.getenv("WEB_CONCURRENCY", "1")) > 1:
+            print("⚠️ ANSWER_CACHE_BACKEND=local is per process; with several workers a re-upserted "
+                  "chapter is only invalidated in one of them. Use ANSWER_CACHE_BACKEND=qdrant.")
+        return LocalAnswerCache()
+    if ANSWER_CACHE_BACKEND == "qdrant":
+        return QdrantAnswerCache(get_client(), dim=dim)
+    return None
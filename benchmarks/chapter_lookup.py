@@ -0,0 +1,55 @@
+"""
+find_pdf_url: indexed lookup vs the old linear scan over ncert_index_final.json.
+
+Run from the repo root:
+    python -m benchmarks.chapter_lookup
+"""
+import json
+import random
+import time
+
+from ncert_parser import find_pdf_url, get_chapter_index
+
+with open("ncert_index_final.json", "r", encoding="utf-8") as f:
+    ncert_index = json.load(f)
+
+
+def find_pdf_url_scan(class_num: int, subject: str, chapter_name: str):
+    # the previous implementation, kept here for comparison
+    subject = subject.lower().strip()
+    chapter_name = chapter_name.strip()
+
+    for entry in ncert_index:
+        if (entry["class"] == class_num and
+            subject in entry["subject"] and
+            chapter_name.lower() in entry["chapter"].lower()):
+            return entry["pdf_url"]
+
+    return None
+
+
+def bench(fn, queries, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for q in queries:
+            fn(*q)
+        best = min(best, time.perf_counter() - started)
+    return 1e6 * best / len(queries)
+
+
+def main():
+    get_chapter_index()  # build outside the timed loop
+    random.seed(0)
+    sample = random.sample(ncert_index, 500)
+    full_titles = [(e["class"], e["subject"], e["chapter"]) for e in sample]
+    numbers = [(e["class"], e["subject"], str(e["chapter_number"])) for e in sample if e.get("chapter_number")]
+    partial = [(e["class"], e["subject"], e["chapter"].split(":")[-1].strip()[:12]) for e in sample]
+
+    print(f"{'queries':<14} {'scan us/op':>12} {'index us/op':>12}")
+    for name, queries in (("full title", full_titles), ("number", numbers), ("partial title", partial)):
+        print(f"{name:<14} {bench(find_pdf_url_scan, queries):>12.1f} {bench(find_pdf_url, queries):>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
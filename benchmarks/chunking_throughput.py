@@ -0,0 +1,61 @@
+"""
+Extraction + chunking throughput: fixed 1000/200 character split vs the structure-aware chunker.
+
+Run from the repo root with local NCERT PDFs:
+    python -m benchmarks.chunking_throughput --pdf jesc101.pdf jesc102.pdf
+"""
+import argparse
+import statistics
+import time
+
+from chapter_upserter import split_pages
+from chunker import chunk_pages
+from ncert_parser import extract_all_pages, page_lines, page_text
+
+
+def timed(fn, repeat: int):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - started)
+    return result, statistics.median(times)
+
+
+def describe(chunks, payloads) -> str:
+    sizes = [len(c) for c in chunks] or [0]
+    spanning = sum(1 for p in payloads if p.get("page_start") != p.get("page_end"))
+    sections = sum(1 for p in payloads if p.get("section"))
+    return (f"{len(chunks):4d} chunks, avg {statistics.mean(sizes):6.0f} chars, "
+            f"{spanning:3d} span pages, {sections:3d} with a section")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pdf", nargs="+", required=True)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    totals = {"fixed": 0.0, "structure": 0.0}
+    page_total = 0
+    for path in args.pdf:
+        text_pages, extract_text = timed(lambda: extract_all_pages(path, page_text), args.repeat)
+        line_pages, extract_lines = timed(lambda: extract_all_pages(path, page_lines), args.repeat)
+        (fixed_chunks, fixed_payloads), split_time = timed(lambda: split_pages(text_pages), args.repeat)
+        (struct_chunks, struct_payloads), chunk_time = timed(lambda: chunk_pages(line_pages), args.repeat)
+
+        page_total += len(text_pages)
+        totals["fixed"] += extract_text + split_time
+        totals["structure"] += extract_lines + chunk_time
+        print(f"{path} ({len(text_pages)} pages)")
+        print(f"  fixed      extract {extract_text * 1000:7.1f} ms  split {split_time * 1000:7.1f} ms  "
+              f"{describe(fixed_chunks, fixed_payloads)}")
+        print(f"  structure  extract {extract_lines * 1000:7.1f} ms  chunk {chunk_time * 1000:7.1f} ms  "
+              f"{describe(struct_chunks, struct_payloads)}")
+
+    for name, seconds in totals.items():
+        print(f"{name:<10} {page_total / seconds:8.1f} pages/s (extract + chunk, one process)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Parity and speed of the torch and ONNX (fp32 / int8) embedding backends.
+
+Parity is the cosine similarity between each backend's vectors and the torch ones on real
+NCERT chunks; latency is single-query encode time, throughput is chunks/s in batches.
+Needs an export first (`python onnx_embedder.py`) and onnxruntime installed.
+
+Run from the repo root with local NCERT PDFs:
+    python -m benchmarks.embed_backends --pdf jesc101.pdf jesc102.pdf
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from chunker import chunk_pages
+from embedder import load_model
+from ncert_parser import extract_all_pages, page_lines
+from onnx_embedder import OnnxSentenceEncoder
+
+QUERIES = [
+    "What is photosynthesis?",
+    "Why do we say that petroleum is a non-renewable resource?",
+    "प्रकाश संश्लेषण क्या है?",
+    "What made the peddler accept Edla Willmansson's invitation?",
+]
+
+
+def cosine_rows(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return (a * b).sum(axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pdf", nargs="+", required=True)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    chunks = []
+    for path in args.pdf:
+        chunks.extend(chunk_pages(extract_all_pages(path, page_lines))[0])
+    print(f"{len(chunks)} chunks from {len(args.pdf)} PDFs")
+
+    backends = {
+        "torch": load_model("torch"),
+        "onnx fp32": OnnxSentenceEncoder(int8=False),
+        "onnx int8": OnnxSentenceEncoder(int8=True),
+    }
+    reference = None
+    for name, model in backends.items():
+        model.encode(chunks[:8], show_progress_bar=False)  # warm up
+
+        started = time.perf_counter()
+        vectors = np.asarray(model.encode(chunks, show_progress_bar=False), dtype=np.float32)
+        throughput = len(chunks) / (time.perf_counter() - started)
+
+        latencies = []
+        for i in range(args.queries):
+            started = time.perf_counter()
+            model.encode([QUERIES[i % len(QUERIES)]], show_progress_bar=False)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+        if reference is None:
+            reference = vectors
+            parity = "reference"
+        else:
+            sims = cosine_rows(vectors, reference)
+            parity = f"cosine vs torch mean {sims.mean():.4f} min {sims.min():.4f}"
+        print(f"{name:<10} {throughput:7.1f} chunks/s   query p50 {statistics.median(latencies):6.2f} ms   {parity}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Throughput of LocalMiniLMEmbedder.embed_query with and without micro-batching.
+
+Run from the repo root:
+    python -m benchmarks.embed_batching --queries 512
+"""
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from embedder import LocalMiniLMEmbedder
+
+QUESTIONS = [
+    "What is photosynthesis?",
+    "Why do we say that petroleum is a non-renewable resource?",
+    "What is the function of digestive enzymes?",
+    "Explain the structure of an atom.",
+    "What was the earliest civilisation of the Indian Subcontinent?",
+    "प्रकाश संश्लेषण क्या है?",
+    "How do plants absorb water from the soil?",
+    "What are the main causes of air pollution?",
+]
+
+
+def run(embedder, concurrency: int, n_queries: int):
+    latencies = []
+
+    def one(i):
+        started = time.perf_counter()
+        embedder.embed_query(f"{QUESTIONS[i % len(QUESTIONS)]} ({i})")
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(n_queries)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "qps": n_queries / elapsed,
+        "p50_ms": 1000 * statistics.median(latencies),
+        "p95_ms": 1000 * latencies[int(0.95 * (len(latencies) - 1))],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=512)
+    parser.add_argument("--window-ms", type=float, default=3.0)
+    parser.add_argument("--max-batch", type=int, default=32)
+    args = parser.parse_args()
+
+    direct = LocalMiniLMEmbedder(batch_window_ms=0)
+    batched = LocalMiniLMEmbedder(batch_window_ms=args.window_ms, max_batch=args.max_batch)
+    # warm both paths once
+    direct.embed_query("warm up")
+    batched.embed_query("warm up")
+
+    print(f"{'callers':>8} {'mode':>8} {'qps':>9} {'p50 ms':>9} {'p95 ms':>9}")
+    for concurrency in (1, 8, 64):
+        for name, embedder in (("direct", direct), ("batched", batched)):
+            r = run(embedder, concurrency, args.queries)
+            print(f"{concurrency:>8} {name:>8} {r['qps']:>9.1f} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f}")
+    print("\nbatcher stats:", batched.batcher.stats())
+    batched.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Dense vs sparse (BM25) vs hybrid RRF retrieval over the eval datasets.
+
+There are no labelled chunks, so quality is approximated by ground-truth coverage: the share
+of the reference answer's terms that appear in the top-k retrieved chunks.
+Needs a Qdrant server with a collection ingested under QDRANT_HYBRID=1.
+
+Run from the repo root:
+    QDRANT_HYBRID=1 python -m benchmarks.hybrid_retrieval --k 5
+"""
+import argparse
+import json
+import statistics
+import time
+
+import registry
+import retrieval
+from qdrant_utils import COLLECTION_NAME, DENSE_VECTOR, QDRANT_HYBRID, SPARSE_VECTOR, search_params
+from sparse_encoder import tokenize
+
+DATASETS = ["evals/dataset/factual.json", "evals/dataset/llm-as-judge-input.json"]
+
+
+def coverage(ground_truth: str, texts: list[str]) -> float:
+    expected = set(tokenize(ground_truth))
+    if not expected:
+        return float("nan")
+    found = set(tokenize(" ".join(texts)))
+    return len(expected & found) / len(expected)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    if not QDRANT_HYBRID:
+        raise SystemExit("set QDRANT_HYBRID=1 (and point at a hybrid collection)")
+
+    rows = []
+    for path in DATASETS:
+        with open(path, "r", encoding="utf-8") as f:
+            rows.extend(json.load(f))
+
+    client = registry.get_qdrant_client()
+    embedder = registry.get_embedder()
+    sparse = registry.get_sparse_encoder()
+
+    def dense(row, vector):
+        return client.query_points(COLLECTION_NAME, query=vector, using=DENSE_VECTOR, limit=args.k,
+                                   query_filter=retrieval.scope_filter(row["cid"]), search_params=search_params()).points
+
+    def sparse_only(row, vector):
+        return client.query_points(COLLECTION_NAME, query=sparse.encode_query(row["question"]), using=SPARSE_VECTOR,
+                                   limit=args.k, query_filter=retrieval.scope_filter(row["cid"])).points
+
+    def hybrid(row, vector):
+        return client.query_points(COLLECTION_NAME, **{
+            **retrieval.candidate_query(row["question"], vector, row["cid"], fetch_k=args.k),
+            "with_vectors": False,
+        }).points
+
+    vectors = [embedder.embed_query(row["question"]) for row in rows]
+    print(f"{len(rows)} questions, k={args.k}")
+    for name, search in (("dense", dense), ("sparse (bm25)", sparse_only), ("hybrid rrf", hybrid)):
+        scores, latencies = [], []
+        for row, vector in zip(rows, vectors):
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                points = search(row, vector)
+                latencies.append((time.perf_counter() - started) * 1000)
+            scores.append(coverage(row["ground_truth"], [p.payload.get("text", "") for p in points]))
+        print(f"{name:<14} coverage {statistics.mean(scores):.3f}   p50 {statistics.median(latencies):6.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Cold-start cost of the NCERT chapter index: the original ncert_parser, which json.load-ed
+ncert_index_final.json into dicts at import, vs the lazy loader (import without the index,
+then slotted ChapterRecords and the ChapterIndex on first use).
+Each variant runs in a fresh interpreter so import time and RSS are isolated.
+
+Run from the repo root:
+    python -m benchmarks.index_cold_start
+"""
+import json
+import subprocess
+import sys
+
+VARIANTS = {
+    "import + json.load (old)": (
+        "import json, requests, fitz\n"
+        "with open('ncert_index_final.json', encoding='utf-8') as f:\n"
+        "    index = json.load(f)\n"
+    ),
+    "json.load dicts": (
+        "import json\n"
+        "with open('ncert_index_final.json', encoding='utf-8') as f:\n"
+        "    index = json.load(f)\n"
+    ),
+    "import ncert_parser (lazy)": (
+        "import ncert_parser\n"
+    ),
+    "slotted records": (
+        "from ncert_index_store import load_chapters\n"
+        "index = load_chapters()\n"
+    ),
+    "import + first lookup": (
+        "from ncert_parser import find_chapter\n"
+        "find_chapter(10, 'science', 'Chemical Reactions and Equations')\n"
+    ),
+}
+
+PROBE = """
+import resource, time, json
+base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+started = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - started
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{"ms": 1000 * elapsed, "rss_kb": peak, "delta_kb": peak - base}}))
+"""
+
+
+def main(repeat: int = 5):
+    print(f"{'variant':<28} {'best ms':>9} {'peak RSS MB':>12} {'delta MB':>9}")
+    for name, code in VARIANTS.items():
+        runs = []
+        for _ in range(repeat):
+            out = subprocess.run([sys.executable, "-W", "ignore", "-c", PROBE.format(code=code)],
+                                 capture_output=True, text=True, check=True)
+            runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+        best = min(runs, key=lambda r: r["ms"])
+        print(f"{name:<28} {best['ms']:>9.1f} {best['rss_kb'] / 1024:>12.1f} {best['delta_kb'] / 1024:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
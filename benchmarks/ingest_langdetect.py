@@ -0,0 +1,60 @@
+"""
+Chapter ingest time (split + embed) with and without per-chunk language detection.
+The old embedder ran langdetect on every chunk; the new default skips it.
+
+Run from the repo root with a local NCERT PDF:
+    python -m benchmarks.ingest_langdetect --pdf jesc101.pdf
+"""
+import argparse
+import time
+
+import fitz  # PyMuPDF
+from langdetect import detect
+
+from chapter_upserter import splitter
+from embedder import LocalMiniLMEmbedder
+from language import detect_language
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pdf", required=True)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with fitz.open(args.pdf) as doc:
+        text = "".join(page.get_text() for page in doc)
+    chunks = splitter.split_text(text)
+    embedder = LocalMiniLMEmbedder(batch_window_ms=0)
+    embedder.embed_documents(chunks[:4])  # warm up
+
+    def old_path():
+        for chunk in chunks:
+            try:
+                detect(chunk)
+            except Exception:
+                pass
+        embedder.embed_documents(chunks)
+
+    def new_default():
+        embedder.embed_documents(chunks)
+
+    def new_opt_in():
+        detect_language.cache_clear()
+        [detect_language(chunk) for chunk in chunks]
+        embedder.embed_documents(chunks)
+
+    print(f"{len(chunks)} chunks from {args.pdf}")
+    for name, fn in (("langdetect per chunk (old)", old_path),
+                     ("no detection (default)", new_default),
+                     ("EMBED_DETECT_LANG=1", new_opt_in)):
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - started)
+        print(f"{name:<28} best {min(timings):.3f}s  mean {sum(timings) / len(timings):.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Chapter upload time and peak Python memory: the old single `upsert` of PointStructs
+built from float lists vs the batched insert_vectors.
+
+Runs against an in-process Qdrant by default; pass --url to hit a real server
+(the collection is dropped and recreated).
+
+Run from the repo root:
+    python -m benchmarks.qdrant_upload --chunks 2000
+    python -m benchmarks.qdrant_upload --url http://localhost:6333 --parallel 4
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import Distance, PointStruct, VectorParams
+
+import registry
+import qdrant_utils
+
+
+def old_insert(client, cid, vectors, texts, payloads):
+    # the previous implementation, kept here for comparison
+    points = [
+        PointStruct(id=qdrant_utils.point_id(cid, i), vector=vec, payload={"text": text, "cid": cid, **payloads[i]})
+        for i, (vec, text) in enumerate(zip(vectors.tolist(), texts))
+    ]
+    client.upsert(collection_name=qdrant_utils.COLLECTION_NAME, points=points)
+
+
+def measure(label, fn):
+    tracemalloc.start()
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<36} {elapsed * 1000:9.1f} ms   peak {peak / 1e6:7.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default=None)
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--parallel", type=int, default=1)
+    args = parser.parse_args()
+
+    client = QdrantClient(url=args.url) if args.url else QdrantClient(":memory:")
+    registry.get_or_create("qdrant_client", lambda: client)
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.chunks, args.dim)).astype(np.float32)
+    texts = [f"chunk {i} " + "x" * 990 for i in range(args.chunks)]
+    payloads = [{"page_start": i // 4 + 1, "page_end": i // 4 + 1} for i in range(args.chunks)]
+
+    def reset():
+        if client.collection_exists(qdrant_utils.COLLECTION_NAME):
+            client.delete_collection(qdrant_utils.COLLECTION_NAME)
+        client.create_collection(
+            qdrant_utils.COLLECTION_NAME,
+            vectors_config=VectorParams(size=args.dim, distance=Distance.COSINE),
+        )
+
+    print(f"{args.chunks} chunks x {args.dim} dims against {args.url or ':memory:'}")
+    reset()
+    measure("single upsert (old)", lambda: old_insert(client, "bench", vectors, texts, payloads))
+    for batch_size in (64, 256):
+        reset()
+        measure(f"insert_vectors batch={batch_size} wait=True",
+                lambda: qdrant_utils.insert_vectors("bench", vectors, texts, payloads,
+                                                    batch_size=batch_size, parallel=args.parallel, wait=True))
+        reset()
+        measure(f"insert_vectors batch={batch_size} barrier",
+                lambda: qdrant_utils.insert_vectors("bench", vectors, texts, payloads,
+                                                    batch_size=batch_size, parallel=args.parallel))
+    count = client.count(qdrant_utils.COLLECTION_NAME, exact=True).count
+    print(f"points after last run: {count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Recall@k and latency of float vs quantized search on the ncert-chapters collection,
+using the questions (and their cids) from evals/dataset/factual.json.
+
+Exact (brute-force float) search is the reference. Needs a Qdrant server with the
+chapters ingested and QDRANT_QUANTIZATION set when the collection was prepared;
+the local :memory: client ignores quantization.
+
+Run from the repo root:
+    python -m benchmarks.quantization_recall --k 5 --repeat 5
+"""
+import argparse
+import json
+import statistics
+import time
+
+from qdrant_client.http.models import Filter, FieldCondition, MatchValue, QuantizationSearchParams, SearchParams
+
+import registry
+from qdrant_utils import COLLECTION_NAME
+
+VARIANTS = {
+    "float (hnsw, quantization ignored)": SearchParams(quantization=QuantizationSearchParams(ignore=True)),
+    "quantized, no rescore": SearchParams(quantization=QuantizationSearchParams(rescore=False)),
+    "quantized, rescore x1.0": SearchParams(quantization=QuantizationSearchParams(rescore=True, oversampling=1.0)),
+    "quantized, rescore x2.0": SearchParams(quantization=QuantizationSearchParams(rescore=True, oversampling=2.0)),
+    "quantized, rescore x3.0": SearchParams(quantization=QuantizationSearchParams(rescore=True, oversampling=3.0)),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dataset", default="evals/dataset/factual.json")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--no-filter", action="store_true", help="search the whole collection instead of the question's cid")
+    args = parser.parse_args()
+
+    with open(args.dataset, "r", encoding="utf-8") as f:
+        dataset = json.load(f)
+
+    client = registry.get_qdrant_client()
+    embedder = registry.get_embedder()
+    info = client.get_collection(COLLECTION_NAME)
+    print(f"{COLLECTION_NAME}: {info.points_count} points, quantization={type(info.config.quantization_config).__name__}")
+
+    def search(vector, cid, params):
+        return client.query_points(
+            collection_name=COLLECTION_NAME,
+            query=vector,
+            query_filter=None if args.no_filter else Filter(must=[FieldCondition(key="cid", match=MatchValue(value=cid))]),
+            limit=args.k,
+            search_params=params,
+            with_payload=False,
+        ).points
+
+    queries = [(embedder.embed_query(row["question"]), row["cid"]) for row in dataset]
+    truth = [{p.id for p in search(vector, cid, SearchParams(exact=True))} for vector, cid in queries]
+
+    for name, params in VARIANTS.items():
+        recalls, latencies = [], []
+        for (vector, cid), expected in zip(queries, truth):
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                points = search(vector, cid, params)
+                latencies.append((time.perf_counter() - started) * 1000)
+            if expected:
+                recalls.append(len({p.id for p in points} & expected) / len(expected))
+        recall = statistics.mean(recalls) if recalls else float("nan")
+        p95 = sorted(latencies)[int(len(latencies) * 0.95) - 1]
+        print(f"{name:<36} recall@{args.k} {recall:.3f}   p50 {statistics.median(latencies):6.1f} ms   p95 {p95:6.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
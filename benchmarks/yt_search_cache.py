@@ -0,0 +1,62 @@
+"""
+API calls and latency of YouTubeSearch with and without its caches, against
+FakeYouTubeAPI with simulated network latency (no key or quota needed).
+
+Run from the repo root:
+    python -m benchmarks.yt_search_cache --requests 400 --concurrency 16
+"""
+import argparse
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from yt_search import FakeYouTubeAPI, YouTubeSearch
+
+QUERIES = [
+    "Chemical Reactions and Equations class 10 science",
+    "chemical reactions and equations Class 10 Science ",
+    "Life Processes class 10 science",
+    "Light Reflection and Refraction class 10",
+    "Nutrition in Plants class 7 science",
+    "The Rise of Nationalism in Europe class 10 history",
+    "Real Numbers class 10 maths",
+    "Polynomials class 10 maths",
+]
+
+
+def run(search: YouTubeSearch, n_requests: int, concurrency: int):
+    rng = random.Random(0)
+    queries = [rng.choice(QUERIES) for _ in range(n_requests)]
+    latencies = []
+
+    def one(query):
+        started = time.perf_counter()
+        search.top_videos(query)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, queries))
+    return time.perf_counter() - started, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency-ms", type=float, default=150)
+    args = parser.parse_args()
+
+    for name, ttl in (("uncached", 0), ("cached", 3600)):
+        api = FakeYouTubeAPI(latency=args.latency_ms / 1000)
+        search = YouTubeSearch(api, search_ttl=ttl, stats_ttl=ttl)
+        elapsed, latencies = run(search, args.requests, args.concurrency)
+        quota = 100 * api.search_calls + api.video_calls
+        print(f"{name:<9} {args.requests / elapsed:8.1f} req/s  p50 {1000 * statistics.median(latencies):7.1f} ms  "
+              f"search.list {api.search_calls:4d}  videos.list {api.video_calls:4d}  quota {quota:6d}  "
+              f"coalesced {search.stats()['coalesced']}")
+
+
+if __name__ == "__main__":
+    main()
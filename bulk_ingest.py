@@ -0,0 +1,321 @@
+"""
+Bulk chapter ingestion: warm a whole class / subject in one pipelined job.
+
+    python bulk_ingest.py --class 10 --subject science
+
+Stages run concurrently with bounded queues between them:
+  download (async HTTP) -> parse (process pool) -> embed (batched across chapters) -> upsert
+Finished cids are appended to a state file, so a re-run resumes where it stopped.
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from uuid import uuid4
+
+import httpx
+
+import registry
+from chapter_upserter import PAGE_FN, chunk_chapter, store_chapter
+from jobs import JOB_MAX_FINISHED, JOB_RETENTION
+from ncert_parser import extract_all_pages, get_chapter_index, get_pdf_pool
+from qdrant_utils import chapter_exists, chapter_id, ensure_collection
+
+BULK_DOWNLOAD_CONCURRENCY = int(os.getenv("BULK_DOWNLOAD_CONCURRENCY", "8"))
+BULK_PARSE_CONCURRENCY = int(os.getenv("BULK_PARSE_CONCURRENCY", str(os.cpu_count() or 1)))
+BULK_EMBED_BATCH = int(os.getenv("BULK_EMBED_BATCH", "256"))
+BULK_QUEUE_SIZE = int(os.getenv("BULK_QUEUE_SIZE", "8"))
+BULK_STATE_PATH = os.getenv("BULK_STATE_PATH", "bulk_ingest_state.txt")
+
+_DONE = object()
+
+# job id -> BulkIngestJob, for the /bulk-ingest status endpoint; finished jobs are evicted
+# like JobQueue's (JOB_RETENTION / JOB_MAX_FINISHED)
+bulk_jobs = {}
+# (class_num, subject) -> id of the job running for that filter
+_bulk_inflight = {}
+
+
+class StageStats:
+    def __init__(self):
+        self.items = 0
+        self.busy = 0.0
+
+    def add(self, items: int, seconds: float):
+        self.items += items
+        self.busy += seconds
+
+    def as_dict(self) -> dict:
+        return {
+            "items": self.items,
+            "busy_seconds": round(self.busy, 2),
+            "items_per_busy_second": round(self.items / self.busy, 2) if self.busy else None,
+        }
+
+
+def load_completed(state_path: str) -> set[str]:
+    if not os.path.exists(state_path):
+        return set()
+    with open(state_path, "r", encoding="utf-8") as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+class BulkIngestJob:
+    def __init__(self, class_num: int = None, subject: str = None, state_path: str = BULK_STATE_PATH,
+                 download_concurrency: int = BULK_DOWNLOAD_CONCURRENCY, parse_concurrency: int = BULK_PARSE_CONCURRENCY,
+                 embed_batch: int = BULK_EMBED_BATCH, queue_size: int = BULK_QUEUE_SIZE):
+        self.id = uuid4().hex
+        self.class_num = class_num
+        self.subject = subject
+        self.state_path = state_path
+        self.download_concurrency = download_concurrency
+        self.parse_concurrency = parse_concurrency
+        self.embed_batch = embed_batch
+        self.queue_size = queue_size
+
+        self.status = "pending"
+        self.total = 0
+        self.skipped = 0
+        self.done = 0
+        self.chunks = 0
+        self.failed = {}
+        self.started_at = None
+        self.finished_at = None
+        self.stages = {name: StageStats() for name in ("download", "parse", "embed", "upsert")}
+
+    def progress(self) -> dict:
+        end = self.finished_at or time.time()
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "filter": {"class_num": self.class_num, "subject": self.subject},
+            "total": self.total,
+            "skipped": self.skipped,
+            "done": self.done,
+            "failed": self.failed,
+            "chunks": self.chunks,
+            "elapsed_seconds": round(end - self.started_at, 2) if self.started_at else 0.0,
+            "stages": {name: stats.as_dict() for name, stats in self.stages.items()},
+        }
+
+    def _fail(self, cid: str, stage: str, error: Exception):
+        print(f"❌ {stage} failed for {cid}: {error}")
+        self.failed[cid] = f"{stage}: {error}"
+
+    def _record_completed(self, cid: str):
+        # state file only: resumed runs skip this chapter
+        with open(self.state_path, "a", encoding="utf-8") as f:
+            f.write(cid + "\n")
+
+    def _mark_done(self, cid: str):
+        self._record_completed(cid)
+        self.done += 1
+
+    async def _download(self, http: httpx.AsyncClient, todo: asyncio.Queue, parse_q: asyncio.Queue):
+        while True:
+            item = await todo.get()
+            if item is _DONE:
+                return
+            record, cid = item
+            started = time.perf_counter()
+            path = None
+            try:
+                if await asyncio.to_thread(chapter_exists, cid):
+                    # counted as skipped, not done, so done/(total - skipped) stays <= 100%
+                    self.skipped += 1
+                    self._record_completed(cid)
+                    continue
+                with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+                    path = f.name
+                    async with http.stream("GET", record.pdf_url) as response:
+                        response.raise_for_status()
+                        async for chunk in response.aiter_bytes():
+                            f.write(chunk)
+            except Exception as e:
+                self._fail(cid, "download", e)
+                if path and os.path.exists(path):
+                    os.remove(path)
+                continue
+            self.stages["download"].add(1, time.perf_counter() - started)
+            await parse_q.put((record, cid, path))
+
+    async def _parse(self, parse_q: asyncio.Queue, embed_q: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await parse_q.get()
+            if item is _DONE:
+                return
+            record, cid, path = item
+            started = time.perf_counter()
+            try:
+                pages = await loop.run_in_executor(get_pdf_pool(), extract_all_pages, path, PAGE_FN)
+                chunks, payloads = chunk_chapter(pages)
+                if not chunks:
+                    raise ValueError("no text extracted")
+            except Exception as e:
+                self._fail(cid, "parse", e)
+                continue
+            finally:
+                os.remove(path)
+            self.stages["parse"].add(1, time.perf_counter() - started)
+            await embed_q.put((record, cid, chunks, payloads))
+
+    async def _embed(self, embed_q: asyncio.Queue, upsert_q: asyncio.Queue):
+        embedder = registry.get_embedder()
+        finished = False
+        while not finished:
+            # Gather whole chapters until the batch is full or nothing else is waiting
+            batch = []
+            item = await embed_q.get()
+            while item is not _DONE:
+                batch.append(item)
+                if sum(len(b[2]) for b in batch) >= self.embed_batch or embed_q.empty():
+                    break
+                item = await embed_q.get()
+            finished = item is _DONE
+            if not batch:
+                continue
+
+            texts = [chunk for _, _, chunks, _ in batch for chunk in chunks]
+            started = time.perf_counter()
+            try:
+                vectors = await asyncio.to_thread(embedder.embed_documents_array, texts)
+            except Exception as e:
+                for _, cid, _, _ in batch:
+                    self._fail(cid, "embed", e)
+                continue
+            self.stages["embed"].add(len(texts), time.perf_counter() - started)
+
+            offset = 0
+            for record, cid, chunks, payloads in batch:
+                await upsert_q.put((record, cid, chunks, vectors[offset:offset + len(chunks)], payloads))
+                offset += len(chunks)
+
+    async def _upsert(self, upsert_q: asyncio.Queue):
+        while True:
+            item = await upsert_q.get()
+            if item is _DONE:
+                return
+            record, cid, chunks, vectors, payloads = item
+            started = time.perf_counter()
+            try:
+                await asyncio.to_thread(store_chapter, cid, chunks, vectors, payloads, record)
+            except Exception as e:
+                self._fail(cid, "upsert", e)
+                continue
+            self.stages["upsert"].add(len(chunks), time.perf_counter() - started)
+            self.chunks += len(chunks)
+            self._mark_done(cid)
+
+    async def run(self):
+        self.status = "running"
+        self.started_at = time.time()
+        try:
+            await asyncio.to_thread(ensure_collection)
+            completed = load_completed(self.state_path)
+            records = [r for r, _ in get_chapter_index().search(self.class_num, self.subject, limit=100000)]
+            self.total = len(records)
+
+            todo = asyncio.Queue()
+            for record in records:
+                cid = chapter_id(record.class_num, record.subject, record.chapter)
+                if cid in completed:
+                    self.skipped += 1
+                else:
+                    todo.put_nowait((record, cid))
+            for _ in range(self.download_concurrency):
+                todo.put_nowait(_DONE)
+
+            parse_q = asyncio.Queue(maxsize=self.queue_size)
+            embed_q = asyncio.Queue(maxsize=self.queue_size)
+            upsert_q = asyncio.Queue(maxsize=self.queue_size)
+
+            async with httpx.AsyncClient(timeout=60, follow_redirects=True) as http:
+                downloaders = [asyncio.create_task(self._download(http, todo, parse_q)) for _ in range(self.download_concurrency)]
+                parsers = [asyncio.create_task(self._parse(parse_q, embed_q)) for _ in range(self.parse_concurrency)]
+                embedder = asyncio.create_task(self._embed(embed_q, upsert_q))
+                upserter = asyncio.create_task(self._upsert(upsert_q))
+
+                # Shut the stages down in order, each once its producers are finished
+                await asyncio.gather(*downloaders)
+                for _ in parsers:
+                    await parse_q.put(_DONE)
+                await asyncio.gather(*parsers)
+                await embed_q.put(_DONE)
+                await embedder
+                await upsert_q.put(_DONE)
+                await upserter
+
+            self.status = "completed" if not self.failed else "completed_with_errors"
+        except Exception as e:
+            print(f"❌ Bulk ingest failed: {e}")
+            self.status = f"failed: {e}"
+        finally:
+            self.finished_at = time.time()
+        return self.progress()
+
+
+async def report_progress(job: BulkIngestJob, every: float = 10.0):
+    while job.finished_at is None:
+        await asyncio.sleep(every)
+        p = job.progress()
+        print(f"⏳ {p['done']}/{p['total'] - p['skipped']} chapters, {p['chunks']} chunks, "
+              f"{len(p['failed'])} failed, {p['elapsed_seconds']}s")
+
+
+async def run_with_progress(job: BulkIngestJob) -> dict:
+    reporter = asyncio.create_task(report_progress(job))
+    try:
+        return await job.run()
+    finally:
+        reporter.cancel()
+
+
+def evict_bulk_jobs(retention: int = JOB_RETENTION, max_finished: int = JOB_MAX_FINISHED):
+    """Drop finished jobs past the retention age, then the oldest beyond max_finished."""
+    cutoff = time.time() - retention
+    finished = sorted((job for job in bulk_jobs.values() if job.finished_at is not None),
+                      key=lambda job: job.finished_at)
+    excess = max(0, len(finished) - max_finished)
+    for i, job in enumerate(finished):
+        if i < excess or job.finished_at < cutoff:
+            del bulk_jobs[job.id]
+
+
+def start_bulk_ingest(class_num: int = None, subject: str = None) -> tuple[BulkIngestJob, bool]:
+    """
+    Start a job on the running event loop (used by the API). Returns (job, coalesced):
+    a request for a filter whose job is still running gets that job instead of a second
+    pipeline appending to the same state file.
+    """
+    evict_bulk_jobs()
+    key = (class_num, subject.lower().strip() if subject else None)
+    running = bulk_jobs.get(_bulk_inflight.get(key))
+    if running is not None and running.finished_at is None:
+        return running, True
+
+    job = BulkIngestJob(class_num=class_num, subject=subject)
+    bulk_jobs[job.id] = job
+    _bulk_inflight[key] = job.id
+
+    def finished(_):
+        if _bulk_inflight.get(key) == job.id:
+            del _bulk_inflight[key]
+        evict_bulk_jobs()
+
+    job.task = asyncio.create_task(job.run())
+    job.task.add_done_callback(finished)
+    return job, False
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-ingest NCERT chapters into Qdrant")
+    parser.add_argument("--class", dest="class_num", type=int, default=None)
+    parser.add_argument("--subject", default=None)
+    parser.add_argument("--state", default=BULK_STATE_PATH)
+    args = parser.parse_args()
+
+    job = BulkIngestJob(class_num=args.class_num, subject=args.subject, state_path=args.state)
+    print(json.dumps(asyncio.run(run_with_progress(job)), indent=2))
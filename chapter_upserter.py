@@ -1,13 +1,90 @@
-from ncert_parser import find_pdf_url, extract_text_from_pdf_url
-from qdrant_utils import ensure_collection, chapter_exists, insert_vectors, chapter_id
+import os
+from bisect import bisect_right
+from ncert_parser import find_chapter, extract_pages_from_pdf_url, page_lines, page_text
+from chunker import BOILERPLATE_RE, chunk_pages, pages_as_text
+from qdrant_utils import QDRANT_HYBRID, ensure_collection, chapter_exists, insert_vectors, chapter_id
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from embedder import LocalMiniLMEmbedder
-from langdetect import detect
+from language import DETECT_LANG, detect_language
+import registry
 
-splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-embedder = LocalMiniLMEmbedder()
+splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200, add_start_index=True)
 
-def upsert_chapter_text(class_num, subject, chapter):
+# "structure" splits on headings / exercises / figures (chunker.py); "fixed" is the 1000/200 character split
+CHUNKER = os.getenv("CHUNKER", "structure").lower()
+PAGE_FN = page_lines if CHUNKER == "structure" else page_text
+
+def clean_page_text(text: str) -> str:
+    return BOILERPLATE_RE.sub("", text)
+
+def split_pages(pages: list[tuple[int, str]]) -> tuple[list[str], list[dict]]:
+    """
+    Split the chapter text into chunks and work out which pages each chunk spans.
+    Returns (chunks, payloads) where each payload has page_start / page_end.
+    """
+    page_offsets, page_numbers, parts = [], [], []
+    offset = 0
+    for page_no, text in pages:
+        text = clean_page_text(text)
+        page_offsets.append(offset)
+        page_numbers.append(page_no)
+        parts.append(text)
+        offset += len(text)
+    raw_text = "".join(parts)
+    full_text = raw_text.strip()
+    lead = len(raw_text) - len(raw_text.lstrip())
+
+    def page_at(pos: int):
+        return page_numbers[max(bisect_right(page_offsets, pos + lead) - 1, 0)]
+
+    chunks, payloads = [], []
+    for doc in splitter.create_documents([full_text]):
+        start = doc.metadata.get("start_index", -1)
+        chunks.append(doc.page_content)
+        if start < 0 or not page_numbers:
+            payloads.append({})
+        else:
+            payloads.append({
+                "page_start": page_at(start),
+                "page_end": page_at(start + len(doc.page_content) - 1),
+            })
+    return chunks, payloads
+
+def chapter_payload(record) -> dict:
+    """Chapter-level payload fields (indexed, used by the wider retrieval scopes)."""
+    return {
+        "class": record.class_num,
+        "subject": record.subject,
+        "chapter": record.chapter,
+        "chapter_number": record.chapter_number,
+    }
+
+def chunk_chapter(pages: list) -> tuple[list[str], list[dict]]:
+    """Chunk pages extracted with PAGE_FN, falling back to the fixed split if no structure was found."""
+    if CHUNKER == "structure":
+        chunks, payloads = chunk_pages(pages)
+        if chunks:
+            return chunks, payloads
+    return split_pages(pages_as_text(pages))
+
+def store_chapter(cid: str, chunks: list[str], vectors, payloads: list[dict], record=None):
+    """Tag, insert and publish the embedded chunks of one chapter."""
+    chapter_fields = chapter_payload(record) if record is not None else {}
+    for chunk, payload in zip(chunks, payloads):
+        payload.update(chapter_fields)
+        if DETECT_LANG:
+            payload["lang"] = detect_language(chunk)
+    sparse_vectors = registry.get_sparse_encoder().encode_documents(chunks) if QDRANT_HYBRID else None
+    insert_vectors(cid, vectors, chunks, payloads=payloads, sparse_vectors=sparse_vectors)
+
+    # Answers cached for the previous version of this chapter are stale now
+    answer_cache = registry.get_answer_cache()
+    if answer_cache is not None:
+        answer_cache.invalidate(cid)
+
+def upsert_chapter_text(class_num, subject, chapter, progress=None):
+    # `progress(stage)` is called as the job moves through its stages (see jobs.py)
+    progress = progress or (lambda stage: None)
+    progress("checking")
     ensure_collection()
     cid = chapter_id(class_num, subject, chapter)
 
@@ -17,13 +94,21 @@ def upsert_chapter_text(class_num, subject, chapter):
             "cid" : cid
         }
 
-    full_text = extract_text_from_pdf_url(find_pdf_url(class_num, subject, chapter))
-    if not full_text or "error" in full_text:
+    progress("downloading")
+    record = find_chapter(class_num, subject, chapter)
+    if record is None:
+        return {"error": "Chapter not found in the NCERT index"}
+    pages = extract_pages_from_pdf_url(record.pdf_url, PAGE_FN)
+    full_text = "".join(text for _, text in pages_as_text(pages)).strip()
+    if not full_text:
         return {"error": "Could not fetch chapter text"}
 
-    chunks = splitter.split_text(full_text)
-    vectors = embedder.embed_documents(chunks)
-    insert_vectors(cid, vectors, chunks)
+    progress("splitting")
+    chunks, payloads = chunk_chapter(pages)
+    progress("embedding")
+    vectors = registry.get_embedder().embed_documents_array(chunks)
+    progress("upserting")
+    store_chapter(cid, chunks, vectors, payloads, record=record)
 
     return {
         "status": "upserted",
@@ -0,0 +1,213 @@
+"""
+Precomputed YouTube recommendations per NCERT chapter.
+
+    python chapter_videos.py                      # fill / refresh the oldest chapters within the quota budget
+    python chapter_videos.py --class 10 --subject science --budget 50
+
+Each chapter's top videos (yt_search scoring) are stored in a small sqlite file next to
+the chapter index, one row per chapter holding its videos as compact JSON arrays. The
+server loads the file into a dict once and answers /chapter-videos from memory; chapters
+not stored yet are searched live and written through. A background thread refreshes a
+budget of chapters every CHAPTER_VIDEOS_REFRESH_HOURS: stale chapters that were asked for
+first, then never-searched ones, then the stalest. Workers sharing the sqlite file take a
+lease so only one of them refreshes per interval.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import registry
+from ncert_index_store import ChapterRecord
+from ncert_parser import get_chapter_index
+from yt_search import compute_score, days_old
+
+CHAPTER_VIDEOS_DB = os.getenv("CHAPTER_VIDEOS_DB", "chapter_videos.sqlite")
+CHAPTER_VIDEOS_TOP_N = int(os.getenv("CHAPTER_VIDEOS_TOP_N", "5"))
+# Chapters refreshed less than this many days ago are skipped by a refresh run
+CHAPTER_VIDEOS_MAX_AGE_DAYS = float(os.getenv("CHAPTER_VIDEOS_MAX_AGE_DAYS", "14"))
+# Live searches per refresh run; each costs ~101 of the 10,000 daily quota units
+CHAPTER_VIDEOS_BUDGET = int(os.getenv("CHAPTER_VIDEOS_BUDGET", "50"))
+# Hours between background refresh runs in the server (0 = off; use the CLI / a cron job).
+# 50 searches a day is about half of the default 10,000-unit daily quota.
+CHAPTER_VIDEOS_REFRESH_HOURS = float(os.getenv("CHAPTER_VIDEOS_REFRESH_HOURS", "24"))
+SEARCH_LIMIT = 6
+
+# Stored per video, in this order
+VIDEO_FIELDS = ("url", "title", "channel", "views", "upload_date")
+
+
+def chapter_key(record: ChapterRecord) -> tuple:
+    return record.class_num, record.subject, record.chapter
+
+
+def chapter_query(record: ChapterRecord) -> str:
+    return f"{record.chapter} class {record.class_num} {record.subject}"
+
+
+def score_video(video: dict) -> dict:
+    # days_old and score move with time, so they are recomputed from the stored fields
+    days = days_old(video["upload_date"])
+    return {**video, "days_old": days, "score": round(compute_score(video["views"], days), 2)}
+
+
+class ChapterVideoStore:
+    def __init__(self, db_path: str = CHAPTER_VIDEOS_DB, top_n: int = CHAPTER_VIDEOS_TOP_N):
+        self.top_n = top_n
+        self._lock = threading.Lock()
+        self._videos = {}  # chapter key -> list of video dicts, best first
+        self._refreshed = {}  # chapter key -> unix time of the last search
+        self._wanted = set()  # stale chapters that were requested, refreshed first
+        self.max_age = CHAPTER_VIDEOS_MAX_AGE_DAYS * 86400
+        self.hits = 0
+        self.misses = 0
+        self._stop = threading.Event()
+        self._refresher = None
+
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chapter_videos ("
+            "class INTEGER NOT NULL, subject TEXT NOT NULL, chapter TEXT NOT NULL, "
+            "refreshed_at REAL NOT NULL, videos TEXT NOT NULL, PRIMARY KEY (class, subject, chapter))"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS refresh_lease (id INTEGER PRIMARY KEY CHECK (id = 0), holder TEXT, until REAL)"
+        )
+        self._db.commit()
+        for class_num, subject, chapter, refreshed_at, videos in self._db.execute("SELECT * FROM chapter_videos"):
+            key = (class_num, subject, chapter)
+            self._videos[key] = [score_video(dict(zip(VIDEO_FIELDS, v))) for v in json.loads(videos)]
+            self._refreshed[key] = refreshed_at
+
+    def get(self, record: ChapterRecord):
+        """Stored videos for the chapter, or None if it has never been searched."""
+        key = chapter_key(record)
+        videos = self._videos.get(key)
+        if videos is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            if self._refreshed[key] < time.time() - self.max_age:
+                self._wanted.add(key)  # still served; the next refresh run updates it first
+        return videos
+
+    def put(self, record: ChapterRecord, results: list[dict]):
+        key = chapter_key(record)
+        videos = [{field: r[field] for field in VIDEO_FIELDS} for r in results[:self.top_n]]
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO chapter_videos VALUES (?, ?, ?, ?, ?)",
+                (*key, now, json.dumps([[v[f] for f in VIDEO_FIELDS] for v in videos], ensure_ascii=False)),
+            )
+            self._db.commit()
+            self._videos[key] = [score_video(v) for v in videos]
+            self._refreshed[key] = now
+            self._wanted.discard(key)
+
+    def search(self, record: ChapterRecord) -> list[dict]:
+        results = registry.get_youtube_search().top_videos(chapter_query(record), SEARCH_LIMIT, self.top_n)
+        self.put(record, results)
+        return self._videos[chapter_key(record)]
+
+    def refresh(self, class_num: int = None, subject: str = None, budget: int = CHAPTER_VIDEOS_BUDGET,
+                max_age_days: float = CHAPTER_VIDEOS_MAX_AGE_DAYS) -> int:
+        """
+        Search at most `budget` chapters older than max_age_days: stale chapters that were
+        requested first, then never-stored ones, then the stalest. Returns how many were refreshed.
+        """
+        done = 0
+        stale = []
+        try:
+            records = [entry for entry, _ in get_chapter_index().search(class_num, subject, limit=10 ** 6)]
+            cutoff = time.time() - max_age_days * 86400
+            stale = [r for r in records if self._refreshed.get(chapter_key(r), 0) < cutoff]
+            stale.sort(key=lambda r: (chapter_key(r) not in self._wanted, self._refreshed.get(chapter_key(r), 0)))
+
+            for record in stale[:budget]:
+                if self._stop.is_set():
+                    break
+                # stops at the first error, most likely the daily quota; the next run resumes
+                self.search(record)
+                done += 1
+        except Exception as e:
+            print(f"⚠️ Chapter video refresh stopped: {e}")
+        print(f"🎬 Refreshed videos for {done} chapters ({len(stale) - done} still stale)")
+        return done
+
+    def claim_refresh(self, seconds: float) -> bool:
+        """Take the refresh lease for `seconds` unless another worker holds it."""
+        now = time.time()
+        holder = f"{os.getpid()}"
+        with self._lock:
+            claimed = self._db.execute(
+                "UPDATE refresh_lease SET holder = ?, until = ? WHERE id = 0 AND (until < ? OR holder = ?)",
+                (holder, now + seconds, now, holder),
+            ).rowcount
+            if not claimed:
+                claimed = self._db.execute(
+                    "INSERT OR IGNORE INTO refresh_lease VALUES (0, ?, ?)", (holder, now + seconds),
+                ).rowcount
+            self._db.commit()
+        return bool(claimed)
+
+    def start_refresher(self, interval_hours: float = CHAPTER_VIDEOS_REFRESH_HOURS, budget: int = CHAPTER_VIDEOS_BUDGET):
+        interval = interval_hours * 3600
+
+        def loop():
+            while not self._stop.is_set():
+                # one worker per store file refreshes each interval
+                if self.claim_refresh(interval * 0.9):
+                    self.refresh(budget=budget)
+                self._stop.wait(interval)
+
+        self._refresher = threading.Thread(target=loop, name="chapter-videos-refresh", daemon=True)
+        self._refresher.start()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "chapters": len(self._videos),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "oldest_refresh": min(self._refreshed.values(), default=None),
+            "stale_requested": len(self._wanted),
+        }
+
+    def close(self):
+        self._stop.set()
+        if self._refresher is not None:
+            self._refresher.join(timeout=5)
+        with self._lock:
+            self._db.close()
+
+
+def chapter_videos(class_num: int, subject: str, chapter: str, limit: int = 3) -> dict:
+    """Precomputed videos for a chapter, falling back to a live search (stored for next time)."""
+    record = get_chapter_index().find(class_num, subject, chapter)
+    if record is None:
+        results = registry.get_youtube_search().top_videos(f"{chapter} class {class_num} {subject}", SEARCH_LIMIT, limit)
+        return {"results": results, "source": "live"}
+
+    store = registry.get_chapter_videos()
+    videos = store.get(record)
+    source = "precomputed"
+    if videos is None:
+        videos = store.search(record)
+        source = "live"
+    return {"chapter": record.as_dict(), "results": videos[:limit], "source": source}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute YouTube videos for NCERT chapters")
+    parser.add_argument("--class", dest="class_num", type=int, default=None)
+    parser.add_argument("--subject", default=None)
+    parser.add_argument("--budget", type=int, default=CHAPTER_VIDEOS_BUDGET)
+    parser.add_argument("--max-age-days", type=float, default=CHAPTER_VIDEOS_MAX_AGE_DAYS)
+    args = parser.parse_args()
+    store = ChapterVideoStore()
+    store.refresh(args.class_num, args.subject, args.budget, args.max_age_days)
+    store.close()
@@ -1,16 +1,17 @@
-import os
 import re
 from typing import Optional
 
-from langchain_groq import ChatGroq
-from langchain_qdrant import QdrantVectorStore
-from qdrant_client import QdrantClient
-from embedder import LocalMiniLMEmbedder
+from langchain_core.runnables import RunnableLambda
+import registry
+import retrieval
+import prompt_builder
+import chat_title
+from qdrant_utils import QDRANT_HYBRID
+from answer_cache import serialize_docs
+from reranker import RERANK_CANDIDATES, RERANK_ENABLED
 
-QDRANT_URL = os.getenv("QDRANT_URL")
-QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
-COLLECTION_NAME = os.getenv("QDRANT_COLLECTION_NAME")
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+# With reranking on, retrieval over-fetches and the cross-encoder picks what goes into the prompt
+RETRIEVE_K = RERANK_CANDIDATES if RERANK_ENABLED else 5
 
 
 def format_profile_context(profile: Optional[dict]) -> str:
@@ -50,88 +51,96 @@ def format_profile_context(profile: Optional[dict]) -> str:
     )
 
 
-def create_chatbot_components(cid: str):
+def build_retriever(scope):
+    # Same retrieval as arun_chatbot: payload fields (cid, chunk_index, pages, section) end up in
+    # the docs' metadata, which merge_chunks, the prompt labels and docs_chapter rely on
+    return RunnableLambda(lambda query: retrieval.retrieve(query, scope, k=RETRIEVE_K, fetch_k=max(20, RETRIEVE_K)))
+
+
+def create_chatbot_components(scope):
     """
-    Create retriever and LLM component for a given cid.
+    Fetch the retriever and LLM component for a given scope (a cid or a scope dict) from the
+    shared registry. Both are built once per process (the retriever once per scope) and reused.
     We return the retriever and llm_main so run_chatbot can:
       1) retrieve using raw user_input
       2) then call LLM with retrieved docs + profile
     """
-    client = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
-    embedder = LocalMiniLMEmbedder()
-
-    db = QdrantVectorStore(
-        client=client,
-        collection_name=COLLECTION_NAME,
-        embedding=embedder,
-        content_payload_key="text",
-    )
-
-    retriever = db.as_retriever(
-        search_kwargs={
-            "k": 5,
-            "filter": {
-                "must": [
-                    {"key": "cid", "match": {"value": cid}}
-                ]
-            }
-        },
-        search_type="mmr",
-    )
-
-    llm_main = ChatGroq(groq_api_key=GROQ_API_KEY, model_name="groq/compound")
+    retriever = registry.get_or_create(("retriever", retrieval.scope_key(scope)), lambda: build_retriever(scope))
+    llm_main = registry.get_llm("groq/compound")
 
     return retriever, llm_main
 
 
-def run_chatbot(messages: list, user_input: str, cid: str, profile: Optional[dict] = None, N_TURNS: int = 3):
+def prepare_components():
     """
-    1) Retrieve relevant NCERT docs using the RAW user_input (no profile injected here).
-    2) If docs found: build final prompt including profile_context and docs, then call LLM.
-    3) If no docs found: return the required message "This answer is not available in the NCERT book."
+    Build what the async chat path looks up synchronously: the embedder, Qdrant client,
+    LLM, caches and chapter index. /chat-ncert calls this in a worker thread until the
+    warm-up is done, so a first build never blocks the event loop.
     """
-    retriever, llm_main = create_chatbot_components(cid)
-    profile_context = format_profile_context(profile)
+    registry.get_embedder()
+    registry.get_async_qdrant_client()
+    registry.get_llm("groq/compound")
+    registry.get_answer_cache()
+    registry.get_reranker()
+    retrieval.get_chapter_index()
+    chat_title.get_title_cache()
+    if QDRANT_HYBRID:
+        registry.get_sparse_encoder()
+    if chat_title.inline_enabled():
+        chat_title.get_structured_llm()
 
-    # Build recent chat history (if any) for context in the final prompt
-    history_pairs = []
-    for i in range(len(messages) - 2, -1, -2):
-        if i + 1 < len(messages):
-            history_pairs.append((messages[i]["content"], messages[i + 1]["content"]))
-    history_pairs = history_pairs[::-1][:N_TURNS]
 
-    chat_history_text = "\n".join(f"User: {u}\nAssistant: {a}" for u, a in history_pairs)
+NOT_AVAILABLE_ANSWER = "This answer is not available in the NCERT book."
 
-    # Append user message to the chat history list (for local state)
-    messages.append({"role": "user", "content": user_input})
 
-    # ---------- Retrieval (ONLY on raw user_input) ----------
-    try:
-        docs = retriever.invoke(user_input)
-    except Exception as e:
-        # retrieval failed — surface an error but avoid silent failure
-        answer = f"❌ Retrieval Error: {e}"
-        print(answer)
-        return answer, []
+def build_chat_history_text(messages: list, N_TURNS: int = 3) -> str:
+    # Recent chat history for the final prompt, capped by tokens (PROMPT_HISTORY_TOKENS) and turns
+    return prompt_builder.build_history(messages, max_tokens=prompt_builder.PROMPT_HISTORY_TOKENS, max_turns=N_TURNS)
 
-    # If retrieval returns 0 documents -> obey your instruction and return the standard message
-    if not docs:
-        answer = "This answer is not available in the NCERT book."
-        messages.append({"role": "assistant", "content": answer})
-        print("📄 Retrieved 0 documents; returning NCERT-not-available message.")
-        return answer, []
 
+def log_retrieved_docs(docs: list):
     # Debug: show retrieved doc count & short snippets
     print(f"📄 Retrieved {len(docs)} documents")
     for i, doc in enumerate(docs):
         snippet = getattr(doc, "page_content", str(doc))[:200].replace("\n", " ")
         print(f"--- Doc {i+1} ---\n{snippet}\n")
 
-    # Compose the NCERT context from retrieved docs
-    combined_context = "\n\n".join(getattr(d, "page_content", str(d)) for d in docs)
 
-    # ---------- Final prompt for the LLM (profile injected here) ----------
-    final_prompt = f"""
+def build_final_prompt(user_input: str, docs: list, chat_history_text: str, profile_context: str,
+                       token_budget: int = prompt_builder.PROMPT_TOKEN_BUDGET) -> tuple[str, dict]:
+    """
+    Final prompt for the LLM (profile injected here). The NCERT context gets whatever the
+    rest of the prompt leaves of `token_budget`: overlapping chunks are merged, repeats
+    dropped and the least relevant text cut. When that leaves less than
+    PROMPT_MIN_CONTEXT_TOKENS, the chat history is cut first. Returns (prompt, token usage).
+    """
+    fixed_tokens = prompt_builder.count_tokens(render_prompt(user_input, "", chat_history_text, profile_context))
+    shortfall = fixed_tokens + prompt_builder.PROMPT_MIN_CONTEXT_TOKENS - token_budget
+    if docs and shortfall > 0 and chat_history_text:
+        history_tokens = prompt_builder.count_tokens(chat_history_text)
+        chat_history_text = prompt_builder.truncate_to_tokens(chat_history_text, history_tokens - shortfall, from_start=True)
+        fixed_tokens = prompt_builder.count_tokens(render_prompt(user_input, "", chat_history_text, profile_context))
+        print(f"⚠️ Prompt over budget; history cut from {history_tokens} to "
+              f"{prompt_builder.count_tokens(chat_history_text)} tokens to make room for context")
+    if docs and fixed_tokens + prompt_builder.PROMPT_MIN_CONTEXT_TOKENS > token_budget:
+        print(f"⚠️ Prompt without context is {fixed_tokens} tokens (budget {token_budget}); "
+              f"keeping the top chunk anyway")
+    combined_context, blocks = prompt_builder.build_context(docs, token_budget - fixed_tokens)
+    prompt = render_prompt(user_input, combined_context, chat_history_text, profile_context)
+    usage = {
+        "prompt_tokens": prompt_builder.count_tokens(prompt),
+        "context_tokens": prompt_builder.count_tokens(combined_context),
+        "history_tokens": prompt_builder.count_tokens(chat_history_text),
+        "context_blocks": blocks,
+        "retrieved_chunks": len(docs),
+    }
+    print(f"🧮 Prompt ≈ {usage['prompt_tokens']} tokens (context {usage['context_tokens']}, "
+          f"history {usage['history_tokens']}, {blocks} blocks from {len(docs)} chunks)")
+    return prompt, usage
+
+
+def render_prompt(user_input: str, combined_context: str, chat_history_text: str, profile_context: str) -> str:
+    return f"""
 You are a teaching assistant helping students by answering their questions using only the NCERT book content provided below.
 
 {profile_context}
@@ -153,16 +162,230 @@ Question:
 Provide the final answer only (no extra commentary). If you need to show step-wise reasoning, enclose it inside <think>...</think> tags so the caller can strip it.
 """
 
-    # Call the LLM with the final prompt
+
+def extract_final_answer(text: str) -> str:
+    # Remove any <think> inner blocks before returning as final answer
+    return re.sub(r"<think>.*?</think>\s*", "", text, flags=re.DOTALL).strip()
+
+
+class ThinkFilter:
+    """
+    Incremental version of extract_final_answer for streamed output.
+    Feed it chunks as they arrive; it returns only the text outside <think>...</think>,
+    even when a tag is split across chunk boundaries.
+    """
+    OPEN = "<think>"
+    CLOSE = "</think>"
+
+    def __init__(self):
+        self.inside = False
+        self.buffer = ""
+        # Whitespace is dropped at the start of the answer and after a </think>
+        self.skip_whitespace = True
+
+    @staticmethod
+    def _partial_tag_len(text: str, tag: str) -> int:
+        # Length of the longest suffix of `text` that could be the start of `tag`
+        for n in range(min(len(text), len(tag) - 1), 0, -1):
+            if text.endswith(tag[:n]):
+                return n
+        return 0
+
+    def feed(self, chunk: str) -> str:
+        self.buffer += chunk
+        out = []
+        while self.buffer:
+            if self.inside:
+                idx = self.buffer.find(self.CLOSE)
+                if idx == -1:
+                    keep = self._partial_tag_len(self.buffer, self.CLOSE)
+                    self.buffer = self.buffer[len(self.buffer) - keep:]
+                    break
+                self.buffer = self.buffer[idx + len(self.CLOSE):]
+                self.inside = False
+                self.skip_whitespace = True
+                continue
+
+            if self.skip_whitespace:
+                self.buffer = self.buffer.lstrip()
+                if not self.buffer:
+                    break
+                self.skip_whitespace = False
+
+            idx = self.buffer.find(self.OPEN)
+            if idx != -1:
+                out.append(self.buffer[:idx])
+                self.buffer = self.buffer[idx + len(self.OPEN):]
+                self.inside = True
+                continue
+            keep = self._partial_tag_len(self.buffer, self.OPEN)
+            out.append(self.buffer[:len(self.buffer) - keep])
+            self.buffer = self.buffer[len(self.buffer) - keep:]
+            break
+        return "".join(out)
+
+    def flush(self) -> str:
+        # An unterminated <think> block is reasoning, never part of the answer
+        rest = "" if self.inside else self.buffer
+        self.buffer = ""
+        return rest
+
+
+def rerank_docs(user_input: str, docs: list) -> list:
+    """
+    Score the retrieved candidates with the cross-encoder (when enabled) and keep only the
+    relevant ones. An empty result means nothing in scope answers the question.
+    """
+    reranker = registry.get_reranker()
+    if reranker is None or not docs:
+        return docs
+    try:
+        return reranker.rerank(user_input, docs)
+    except Exception as e:
+        print(f"⚠️ Rerank failed, using retrieval order: {e}")
+        return docs[:5]
+
+
+async def arerank_docs(user_input: str, docs: list) -> list:
+    reranker = registry.get_reranker()
+    if reranker is None or not docs:
+        return docs
+    try:
+        return await reranker.arerank(user_input, docs, executor=registry.get_embed_executor())
+    except Exception as e:
+        print(f"⚠️ Rerank failed, using retrieval order: {e}")
+        return docs[:5]
+
+
+def answer_cache_for(messages: list, profile: Optional[dict], scope):
+    """
+    The semantic answer cache only serves single-chapter first turns without a profile:
+    history or profile context change what a good answer looks like, and cached answers
+    are keyed (and invalidated) per cid.
+    """
+    if messages or profile or retrieval.single_cid(scope) is None:
+        return None
+    return registry.get_answer_cache()
+
+
+def _answer_cache_hit(messages: list, user_input: str, cached):
+    answer, _ = cached
+    messages.append({"role": "user", "content": user_input})
+    messages.append({"role": "assistant", "content": answer})
+    print("♻️ Answer cache hit")
+
+
+def lookup_answer_cache(messages: list, user_input: str, profile: Optional[dict], scope):
+    """
+    Semantic answer cache lookup for this turn. Returns (answer_cache, query_vector, cached):
+    answer_cache is None when the cache doesn't apply or the lookup failed (so nothing is
+    stored either), query_vector is reused by retrieval, and cached is (answer, docs) on a
+    hit, which is then already recorded in `messages`.
+    """
+    answer_cache = answer_cache_for(messages, profile, scope)
+    if answer_cache is None:
+        return None, None, None
+    query_vector = None
+    try:
+        query_vector = registry.get_embedder().embed_query(user_input)
+        cached = answer_cache.lookup(retrieval.single_cid(scope), query_vector)
+    except Exception as e:
+        print(f"⚠️ Answer cache lookup failed: {e}")
+        return None, query_vector, None
+    if cached is not None:
+        _answer_cache_hit(messages, user_input, cached)
+    return answer_cache, query_vector, cached
+
+
+async def alookup_answer_cache(messages: list, user_input: str, profile: Optional[dict], scope):
+    answer_cache = answer_cache_for(messages, profile, scope)
+    if answer_cache is None:
+        return None, None, None
+    query_vector = None
+    try:
+        query_vector = await registry.aembed_query(user_input)
+        cached = await answer_cache.alookup(retrieval.single_cid(scope), query_vector)
+    except Exception as e:
+        print(f"⚠️ Answer cache lookup failed: {e}")
+        return None, query_vector, None
+    if cached is not None:
+        _answer_cache_hit(messages, user_input, cached)
+    return answer_cache, query_vector, cached
+
+
+def title_wanted(messages: list) -> bool:
+    """
+    Whether this turn names the chat for /chat-title: first turns, unless titles come from
+    a separate LLM call (CHAT_TITLE_MODE=llm). In inline mode the answer's LLM call also
+    returns the title; otherwise it is extracted from the question and retrieved chapter.
+    """
+    return not messages and chat_title.CHAT_TITLE_MODE != "llm"
+
+
+def remember_chat_title(user_input: str, docs: list, title: Optional[str] = None) -> str:
+    return chat_title.remember_title(user_input, title or chat_title.extractive_title(user_input, chat_title.docs_chapter(docs)))
+
+
+def run_chatbot(messages: list, user_input: str, cid: str = None, profile: Optional[dict] = None, N_TURNS: int = 3,
+                scope=None):
+    """
+    1) Retrieve relevant NCERT docs using the RAW user_input (no profile injected here).
+    2) If docs found: build final prompt including profile_context and docs, then call LLM.
+    3) If no docs found: return the required message "This answer is not available in the NCERT book."
+    `scope` widens retrieval beyond one cid (a list of chapters, a subject or a class; see
+    retrieval.scope_filter) and takes precedence over `cid`.
+    """
+    scope = scope or cid
+    cid = retrieval.single_cid(scope)
+    with_title = title_wanted(messages)
+    retriever, llm_main = create_chatbot_components(scope)
+    profile_context = format_profile_context(profile)
+    chat_history_text = build_chat_history_text(messages, N_TURNS)
+
+    # ---------- Semantic answer cache (near-duplicate first questions) ----------
+    # the query embedding is cached, so the retriever below reuses it
+    answer_cache, query_vector, cached = lookup_answer_cache(messages, user_input, profile, scope)
+    if cached is not None:
+        answer, docs = cached
+        if with_title:
+            remember_chat_title(user_input, docs)
+        return answer, docs
+
+    # Append user message to the chat history list (for local state)
+    messages.append({"role": "user", "content": user_input})
+
+    # ---------- Retrieval (ONLY on raw user_input) ----------
     try:
-        llm_response = llm_main.invoke(final_prompt)
-        raw_text = getattr(llm_response, "content", str(llm_response)).strip()
+        docs = retriever.invoke(user_input)
+    except Exception as e:
+        # retrieval failed — surface an error but avoid silent failure
+        answer = f"❌ Retrieval Error: {e}"
+        print(answer)
+        return answer, []
+    docs = rerank_docs(user_input, docs)
 
-        # Remove any <think> inner blocks before returning as final answer (as you used earlier)
-        def extract_final_answer(text: str) -> str:
-            return re.sub(r"<think>.*?</think>\s*", "", text, flags=re.DOTALL).strip()
+    # No document retrieved, or none scored above the rerank threshold -> standard message
+    if not docs:
+        answer = NOT_AVAILABLE_ANSWER
+        messages.append({"role": "assistant", "content": answer})
+        print("📄 No relevant documents; returning NCERT-not-available message.")
+        return answer, []
 
+    log_retrieved_docs(docs)
+    final_prompt, usage = build_final_prompt(user_input, docs, chat_history_text, profile_context)
+
+    # Call the LLM with the final prompt
+    try:
+        raw_text, title = chat_title.answer_with_title(llm_main, final_prompt, with_title)
         answer = extract_final_answer(raw_text)
+        if with_title:
+            remember_chat_title(user_input, docs, title)
+
+        if answer_cache is not None:
+            try:
+                answer_cache.store(cid, query_vector, answer, docs)
+            except Exception as e:
+                print(f"⚠️ Answer cache store failed: {e}")
 
     except Exception as e:
         answer = f"❌ Model Error: {str(e)}"
@@ -174,6 +397,155 @@ Provide the final answer only (no extra commentary). If you need to show step-wi
     return answer, docs
 
 
+async def arun_chatbot(messages: list, user_input: str, cid: str = None, profile: Optional[dict] = None, N_TURNS: int = 3,
+                       scope=None):
+    """
+    Async twin of run_chatbot, used by the /chat-ncert endpoint.
+    The embedding runs on a bounded executor, Qdrant is queried through AsyncQdrantClient
+    and the LLM through ainvoke, so one worker can hold many chats in flight.
+    """
+    scope = scope or cid
+    cid = retrieval.single_cid(scope)
+    with_title = title_wanted(messages)
+    llm_main = registry.get_llm("groq/compound")
+    profile_context = format_profile_context(profile)
+    chat_history_text = build_chat_history_text(messages, N_TURNS)
+
+    answer_cache, query_vector, cached = await alookup_answer_cache(messages, user_input, profile, scope)
+    if cached is not None:
+        answer, docs = cached
+        if with_title:
+            remember_chat_title(user_input, docs)
+        return answer, docs
+
+    messages.append({"role": "user", "content": user_input})
+
+    try:
+        docs = await retrieval.aretrieve(user_input, scope, k=RETRIEVE_K, fetch_k=max(20, RETRIEVE_K),
+                                         query_vector=query_vector)
+    except Exception as e:
+        answer = f"❌ Retrieval Error: {e}"
+        print(answer)
+        return answer, []
+    docs = await arerank_docs(user_input, docs)
+
+    if not docs:
+        answer = NOT_AVAILABLE_ANSWER
+        messages.append({"role": "assistant", "content": answer})
+        print("📄 No relevant documents; returning NCERT-not-available message.")
+        return answer, []
+
+    log_retrieved_docs(docs)
+    final_prompt, usage = build_final_prompt(user_input, docs, chat_history_text, profile_context)
+
+    try:
+        async with registry.get_llm_semaphore():
+            raw_text, title = await chat_title.aanswer_with_title(llm_main, final_prompt, with_title)
+        answer = extract_final_answer(raw_text)
+        if with_title:
+            remember_chat_title(user_input, docs, title)
+
+        if answer_cache is not None:
+            try:
+                await answer_cache.astore(cid, query_vector, answer, docs)
+            except Exception as e:
+                print(f"⚠️ Answer cache store failed: {e}")
+
+    except Exception as e:
+        answer = f"❌ Model Error: {str(e)}"
+        docs = []
+        print(answer)
+
+    messages.append({"role": "assistant", "content": answer})
+    return answer, docs
+
+
+async def astream_chatbot(messages: list, user_input: str, cid: str = None, profile: Optional[dict] = None, N_TURNS: int = 3,
+                          scope=None):
+    """
+    Streaming variant of arun_chatbot. Yields (event, data) pairs:
+      ("docs", [...])        retrieved docs, sent before generation starts
+      ("token", "...")       answer text with <think> blocks filtered out
+      ("done", {"answer"})   the full answer once the stream ends (plus "title" on first turns
+                             unless CHAT_TITLE_MODE=llm)
+      ("error", "...")       retrieval or model failure
+    """
+    scope = scope or cid
+    cid = retrieval.single_cid(scope)
+    with_title = title_wanted(messages)
+    llm_main = registry.get_llm("groq/compound")
+    profile_context = format_profile_context(profile)
+    chat_history_text = build_chat_history_text(messages, N_TURNS)
+
+    answer_cache, query_vector, cached = await alookup_answer_cache(messages, user_input, profile, scope)
+    if cached is not None:
+        answer, docs = cached
+        yield "docs", serialize_docs(docs)
+        yield "token", answer
+        done = {"answer": answer}
+        if with_title:
+            done["title"] = remember_chat_title(user_input, docs)
+        yield "done", done
+        return
+
+    messages.append({"role": "user", "content": user_input})
+
+    try:
+        docs = await retrieval.aretrieve(user_input, scope, k=RETRIEVE_K, fetch_k=max(20, RETRIEVE_K),
+                                         query_vector=query_vector)
+    except Exception as e:
+        answer = f"❌ Retrieval Error: {e}"
+        print(answer)
+        yield "error", answer
+        return
+    docs = await arerank_docs(user_input, docs)
+
+    yield "docs", serialize_docs(docs)
+
+    if not docs:
+        answer = NOT_AVAILABLE_ANSWER
+        messages.append({"role": "assistant", "content": answer})
+        print("📄 No relevant documents; returning NCERT-not-available message.")
+        yield "token", answer
+        yield "done", {"answer": answer}
+        return
+
+    log_retrieved_docs(docs)
+    final_prompt, usage = build_final_prompt(user_input, docs, chat_history_text, profile_context)
+
+    think_filter = ThinkFilter()
+    parts = []
+    try:
+        async with registry.get_llm_semaphore():
+            async for chunk in llm_main.astream(final_prompt):
+                text = think_filter.feed(getattr(chunk, "content", str(chunk)))
+                if text:
+                    parts.append(text)
+                    yield "token", text
+        text = think_filter.flush()
+        if text:
+            parts.append(text)
+            yield "token", text
+    except Exception as e:
+        answer = f"❌ Model Error: {str(e)}"
+        print(answer)
+        yield "error", answer
+        return
+
+    answer = "".join(parts).strip()
+    messages.append({"role": "assistant", "content": answer})
+    if answer_cache is not None:
+        try:
+            await answer_cache.astore(cid, query_vector, answer, docs)
+        except Exception as e:
+            print(f"⚠️ Answer cache store failed: {e}")
+    done = {"answer": answer, "usage": usage}
+    if with_title:
+        # tokens are streamed as plain text, so the title here is the extractive one
+        done["title"] = remember_chat_title(user_input, docs)
+    yield "done", done
+
+
 # Quick CLI test helper
 if __name__ == "__main__":
     print("💬 NCERT Chatbot Ready! Type your question or 'exit' to quit.")
@@ -1,27 +1,193 @@
 import os
-from langchain_groq import ChatGroq
-from langchain_core.prompts import ChatPromptTemplate
+import re
+import threading
+from typing import Optional
 
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+from langchain_core.exceptions import OutputParserException
+from pydantic import BaseModel, Field, ValidationError
 
-def chat_title(user_input, llm_response):
-    llm = ChatGroq(groq_api_key=GROQ_API_KEY, model_name="groq/compound")
-    CHAT_PROMPT = ChatPromptTemplate.from_template("""You are a helpful assistant that has to give a suitable title to the chat provided between a user and an llm.
+import registry
+from embedding_cache import normalize_query
+from ttl_cache import TTLCache
+
+# llm:        /chat-title asks the LLM (one extra call per new chat), results cached
+# extractive: keywords from the question (+ the retrieved chapter title), no LLM call at all
+# inline:     the first chat answer also returns a title via structured output and
+#             /chat-title serves it from the cache (extractive on a miss)
+CHAT_TITLE_MODE = os.getenv("CHAT_TITLE_MODE", "llm").lower()
+# Model answering first turns in inline mode; it must support JSON mode, so there is no
+# default (groq/compound, the chat model, doesn't). Unset, inline mode serves extractive titles.
+CHAT_TITLE_INLINE_MODEL = os.getenv("CHAT_TITLE_INLINE_MODEL", "")
+TITLE_CACHE_SIZE = int(os.getenv("TITLE_CACHE_SIZE", "10000"))
+TITLE_CACHE_TTL = int(os.getenv("TITLE_CACHE_TTL", str(24 * 3600)))
+TITLE_MAX_WORDS = 5
+FALLBACK_TITLE = "NCERT Doubt"
+
+# Question words and filler that don't belong in a title (on top of the usual stopwords)
+TITLE_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were "
+    "what which who whom whose why how when where with do does did can could would should will "
+    "i me my we our you your he she they them their please tell explain describe define give list "
+    "write state mention name about between some any there these those us much many also than into "
+    "क्या है हैं कैसे क्यों कौन किस की के का को में से और एक यह वह".split()
+)
+WORD_RE = re.compile(r"[A-Za-z0-9ऀ-ॣ०-ॿ]+(?:['’][A-Za-z]+)?")
+CHAPTER_PREFIX_RE = re.compile(r"^(?:chapter|unit|lesson|ch)\.?\s*\d+\s*[:.\-]?\s*", re.IGNORECASE)
+
+TITLE_PROMPT = """You are a helpful assistant that has to give a suitable title to the chat provided between a user and an llm.
     Make sure your title is only 4-5 words.
     User:
     {user_input}
     llm:
     {llm_response}
-    """)
-    chain = CHAT_PROMPT|llm
-    response = chain.invoke(
-        {
-            "user_input" : user_input,
-            "llm_response" : llm_response
-        }
+    """
+
+
+class ChatTurn(BaseModel):
+    """Structured output for a first chat turn: the answer plus a title for the chat."""
+    answer: str = Field(description="The complete answer to the student's question, following all the instructions")
+    title: str = Field(description="A 4-5 word title for this chat, based on the question")
+
+
+def get_title_cache() -> TTLCache:
+    # normalized first question -> title, shared by the chat endpoints and /chat-title
+    return registry.get_or_create("title_cache", lambda: TTLCache(TITLE_CACHE_SIZE, TITLE_CACHE_TTL))
+
+
+def get_title_chain():
+    def build():
+        from langchain_core.prompts import ChatPromptTemplate
+        return ChatPromptTemplate.from_template(TITLE_PROMPT) | registry.get_llm("groq/compound")
+    return registry.get_or_create("title_chain", build)
+
+
+INLINE_JSON_INSTRUCTIONS = """
+Return a JSON object with two keys: "answer" (the complete answer as described above, as a string)
+and "title" (a 4-5 word title for this chat, based on the question).
+"""
+
+_inline_failed = threading.Event()
+
+
+def get_structured_llm():
+    # the chat LLM answering in the ChatTurn schema (CHAT_TITLE_MODE=inline); JSON mode
+    # rather than tool calling, which Groq's compound systems don't offer
+    return registry.get_or_create(
+        "chat_turn_llm",
+        lambda: registry.get_llm(CHAT_TITLE_INLINE_MODEL).with_structured_output(ChatTurn, method="json_mode"),
     )
-    output = response.content 
-    return output
+
+
+def inline_enabled() -> bool:
+    return CHAT_TITLE_MODE == "inline" and bool(CHAT_TITLE_INLINE_MODEL) and not _inline_failed.is_set()
+
+
+if CHAT_TITLE_MODE == "inline" and not CHAT_TITLE_INLINE_MODEL:
+    print("⚠️ CHAT_TITLE_MODE=inline needs CHAT_TITLE_INLINE_MODEL (a model with JSON mode); using extractive titles")
+
+
+def _unsupported(error: Exception) -> bool:
+    # The model can't do structured output: it rejected JSON mode (400) or answered off-schema.
+    # Rate limits, timeouts and server errors are transient and leave inline mode on.
+    return isinstance(error, (OutputParserException, ValidationError)) or getattr(error, "status_code", None) == 400
+
+
+def _disable_inline(error: Exception):
+    if not _inline_failed.is_set():
+        _inline_failed.set()
+        print(f"⚠️ Structured answer failed ({error}); answering without inline titles from now on")
+
+
+def _llm_text(llm_response) -> str:
+    return getattr(llm_response, "content", str(llm_response)).strip()
+
+
+def answer_with_title(llm, prompt: str, with_title: bool = False) -> tuple[str, Optional[str]]:
+    """
+    (raw answer text, title or None). In inline mode the answer and title come from one
+    structured call. If the model can't do structured output, the plain `llm` answers
+    and inline mode is switched off so later first turns don't pay for a failing call
+    again; other errors (rate limits, timeouts) are raised like a plain call's would be.
+    """
+    if with_title and inline_enabled():
+        try:
+            turn = get_structured_llm().invoke(prompt + INLINE_JSON_INSTRUCTIONS)
+            return turn.answer.strip(), turn.title
+        except Exception as e:
+            if not _unsupported(e):
+                raise
+            _disable_inline(e)
+    return _llm_text(llm.invoke(prompt)), None
+
+
+async def aanswer_with_title(llm, prompt: str, with_title: bool = False) -> tuple[str, Optional[str]]:
+    if with_title and inline_enabled():
+        try:
+            turn = await get_structured_llm().ainvoke(prompt + INLINE_JSON_INSTRUCTIONS)
+            return turn.answer.strip(), turn.title
+        except Exception as e:
+            if not _unsupported(e):
+                raise
+            _disable_inline(e)
+    return _llm_text(await llm.ainvoke(prompt)), None
+
+
+def clean_title(title: str) -> str:
+    title = re.sub(r"<think>.*?</think>", "", title, flags=re.DOTALL)
+    return title.strip().strip("\"'*#").strip()
+
+
+def remember_title(user_input: str, title: str) -> str:
+    title = clean_title(title or "") or extractive_title(user_input)
+    get_title_cache().set(normalize_query(user_input), title)
+    return title
+
+
+def extractive_title(user_input: str, chapter: Optional[str] = None) -> str:
+    """Zero-latency title: the question's keywords, followed by the chapter title if known."""
+    words = []
+    seen = set()
+    for word in WORD_RE.findall(user_input):
+        key = word.casefold()
+        if key in TITLE_STOPWORDS or key in seen or (len(word) < 3 and not word.isdigit()):
+            continue
+        seen.add(key)
+        words.append(word if word.isupper() else word[:1].upper() + word[1:].lower())
+    chapter = CHAPTER_PREFIX_RE.sub("", chapter or "").strip()
+    title = " ".join(words[:TITLE_MAX_WORDS - 2 if chapter else TITLE_MAX_WORDS])
+    if chapter and chapter.casefold() not in title.casefold():
+        title = f"{title} · {chapter}" if title else chapter
+    return title or FALLBACK_TITLE
+
+
+def docs_chapter(docs: list) -> Optional[str]:
+    # chapter title of the best retrieved chunk (stored in its payload at upsert)
+    for doc in docs:
+        chapter = getattr(doc, "metadata", {}).get("chapter")
+        if chapter:
+            return chapter
+    return None
+
+
+def chat_title(user_input, llm_response):
+    cache = get_title_cache()
+    key = normalize_query(user_input)
+    title = cache.get(key)
+    if title is not None:
+        return title
+
+    if CHAT_TITLE_MODE == "llm":
+        response = get_title_chain().invoke(
+            {
+                "user_input" : user_input,
+                "llm_response" : llm_response
+            }
+        )
+        title = clean_title(response.content) or extractive_title(user_input)
+    else:
+        title = extractive_title(user_input)
+    cache.set(key, title)
+    return title
 
 if __name__ == "__main__":
     user_input = input("Enter user input: ")
@@ -0,0 +1,172 @@
+"""
+Structure-aware chunking of NCERT chapters.
+
+Works on the per-page lines produced by ncert_parser.page_lines (text, font size, bold,
+starts a new block). The body font size is the most common size in the chapter; larger
+or bold short lines are headings, and headings, exercise / activity headers and figure
+captions start a new chunk. Long sections are split at block boundaries. Every chunk
+records its pages, section title, referenced figures and a short extractive summary.
+"""
+import os
+import re
+from collections import Counter
+
+CHUNK_MAX_CHARS = int(os.getenv("CHUNK_MAX_CHARS", "1000"))
+CHUNK_MIN_CHARS = int(os.getenv("CHUNK_MIN_CHARS", "200"))
+# A line this much larger than the body text is a heading
+HEADING_SIZE_RATIO = float(os.getenv("CHUNK_HEADING_SIZE_RATIO", "1.15"))
+HEADING_MAX_CHARS = 120
+SUMMARY_MAX_CHARS = 200
+
+# Print-run footers repeated on every NCERT page ("Reprint 2025-26", "Rationalised 2023-24")
+BOILERPLATE_RE = re.compile(r"^[ \t]*(?:Reprint|Rationalised)[ \t]+\d{4}-\d{2}[ \t]*\n?", re.MULTILINE | re.IGNORECASE)
+PAGE_NUMBER_RE = re.compile(r"^\d{1,3}$")
+SECTION_NUMBER_RE = re.compile(r"^\d+(?:\.\d+)+\s+\S")
+EXERCISE_RE = re.compile(
+    r"^(?:exercises?|questions|let us recall|keywords|what you have learnt|summary|activity\s+\d+(?:\.\d+)*|"
+    r"अभ्यास|प्रश्न|क्रियाकलाप\s*\d*)\b",
+    re.IGNORECASE,
+)
+FIGURE_RE = re.compile(r"^(?:fig(?:ure)?\.?|चित्र)\s*\d+(?:\.\d+)*", re.IGNORECASE)
+FIGURE_REF_RE = re.compile(r"\b(?:Fig(?:ure)?\.?|चित्र)\s*(\d+(?:\.\d+)+)", re.IGNORECASE)
+SENTENCE_END_RE = re.compile(r"(?<=[.?!।])\s")
+# A full stop after these is not the end of a sentence ("Fig. 3.2", "No. 4", "e.g. iron")
+ABBREVIATION_RE = re.compile(
+    r"(?:^|[\s(])(?:figs?|nos?|eq|eqs|e\.g|i\.e|etc|viz|vs|cf|approx|ch|pp?|st|dr|mr|mrs|ms|[a-z])\.$",
+    re.IGNORECASE,
+)
+
+
+def is_boilerplate(text: str) -> bool:
+    return bool(BOILERPLATE_RE.match(text)) or bool(PAGE_NUMBER_RE.match(text))
+
+
+def body_font_size(pages) -> float:
+    sizes = Counter()
+    for _, lines in pages:
+        for text, size, _, _ in lines:
+            sizes[size] += len(text)
+    return sizes.most_common(1)[0][0] if sizes else 0.0
+
+
+def line_kind(text: str, size: float, bold: bool, body_size: float):
+    """'heading', 'exercise', 'figure' or None for ordinary text."""
+    if FIGURE_RE.match(text):
+        return "figure"
+    if EXERCISE_RE.match(text) and len(text) <= HEADING_MAX_CHARS:
+        return "exercise"
+    if len(text) <= HEADING_MAX_CHARS and body_size and (
+            size >= body_size * HEADING_SIZE_RATIO or (bold and SECTION_NUMBER_RE.match(text))):
+        return "heading"
+    return None
+
+
+def first_sentence(text: str) -> str:
+    for match in SENTENCE_END_RE.finditer(text):
+        if not ABBREVIATION_RE.search(text[:match.start()]):
+            return text[:match.start()]
+    return text
+
+
+def summarize(text: str, section: str = None) -> str:
+    """First sentence of the chunk (cheap, extractive), prefixed by its section."""
+    body = " ".join(text.split())
+    first = first_sentence(body)
+    if len(first) > SUMMARY_MAX_CHARS:
+        first = first[:SUMMARY_MAX_CHARS].rsplit(" ", 1)[0] + "…"
+    return f"{section}: {first}" if section else first
+
+
+def pages_as_text(pages) -> list[tuple[int, str]]:
+    """(page, lines) pages back to (page, text), e.g. for the fixed-size splitter."""
+    result = []
+    for page_no, content in pages:
+        if isinstance(content, str):
+            result.append((page_no, content))
+        else:
+            result.append((page_no, "\n".join(text for text, _, _, _ in content) + "\n"))
+    return result
+
+
+class _Chunk:
+    __slots__ = ("lines", "size", "page_start", "page_end", "section", "body_start")
+
+    def __init__(self, section):
+        self.lines = []
+        self.body_start = None  # index of the first non-heading line, used for the summary
+        self.size = 0
+        self.page_start = None
+        self.page_end = None
+        self.section = section
+
+    def add(self, text: str, page_no: int, new_block: bool, is_body: bool = True):
+        if self.lines and new_block:
+            self.lines.append("")  # blank line between paragraphs
+        if is_body and self.body_start is None:
+            self.body_start = len(self.lines)
+        self.lines.append(text)
+        self.size += len(text) + 1
+        if self.page_start is None:
+            self.page_start = page_no
+        self.page_end = page_no
+
+    def text(self) -> str:
+        return "\n".join(self.lines).strip()
+
+    def body(self) -> str:
+        return "\n".join(self.lines[self.body_start or 0:]).strip()
+
+
+def chunk_pages(pages, max_chars: int = CHUNK_MAX_CHARS, min_chars: int = CHUNK_MIN_CHARS) -> tuple[list[str], list[dict]]:
+    """
+    Split a chapter given as [(page_number, lines)] into structural chunks.
+    Returns (chunks, payloads) like chapter_upserter.split_pages; payloads carry
+    page_start / page_end, section, summary and the figures the chunk mentions.
+    """
+    body_size = body_font_size(pages)
+    chunks, payloads = [], []
+    section = None
+    current = _Chunk(section)
+
+    def flush():
+        nonlocal current
+        text = current.text()
+        if text:
+            payload = {
+                "page_start": current.page_start,
+                "page_end": current.page_end,
+                "summary": summarize(current.body(), current.section),
+            }
+            if current.section:
+                payload["section"] = current.section
+            figures = sorted(set(FIGURE_REF_RE.findall(text)))
+            if figures:
+                payload["figures"] = figures
+            chunks.append(text)
+            payloads.append(payload)
+        current = _Chunk(section)
+
+    for page_no, lines in pages:
+        # Start each page fresh once the running chunk is big enough to stand alone
+        if current.size >= min_chars:
+            flush()
+        for text, size, bold, new_block in lines:
+            if not text or is_boilerplate(text):
+                continue
+            kind = line_kind(text, size, bold, body_size)
+            if kind in ("heading", "exercise"):
+                # body text before a new heading stays under its own section, however short;
+                # a chunk holding only headings so far is led by this one instead
+                if current.body_start is not None:
+                    flush()
+                section = text
+                current.section = section
+            elif kind is not None and current.size >= min_chars:
+                flush()
+            if current.size + len(text) > max_chars and current.size >= min_chars and new_block:
+                flush()
+            elif current.size + len(text) > max_chars * 1.5:
+                flush()
+            current.add(text, page_no, new_block, is_body=kind not in ("heading", "exercise"))
+    flush()
+    return chunks, payloads
@@ -0,0 +1,115 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """
+    Collects single-text encode requests from many callers and runs them through
+    the model together. A batch is closed when `window_ms` has passed since its
+    first request or when it reaches `max_batch` texts, whichever comes first.
+    Every caller gets its own vector back through a Future.
+    """
+
+    def __init__(self, encode_fn, window_ms: float = 3.0, max_batch: int = 32):
+        self.encode_fn = encode_fn
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._max_batch_seen = 0
+        self._last_batch_size = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="embed-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        if self._closed:
+            raise RuntimeError("MicroBatcher is closed")
+        future = Future()
+        self._queue.put((text, future, time.perf_counter()))
+        return future
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = first[2] + self.window
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # put the sentinel back so the loop exits after this batch
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            try:
+                self._encode_batch(batch)
+            except Exception as e:
+                # never let the thread die: every later embed would wait forever
+                print(f"⚠️ Embedding batch failed: {e}")
+
+    def _encode_batch(self, batch):
+        # Drop requests whose caller gave up (e.g. a cancelled aembed_query); the rest
+        # are marked running so they can no longer be cancelled under us
+        batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        started = time.perf_counter()
+        texts = [text for text, _, _ in batch]
+        try:
+            vectors = self.encode_fn(texts)
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        for (_, future, _), vec in zip(batch, vectors):
+            future.set_result(vec.tolist())
+
+        waits = [started - enqueued for _, _, enqueued in batch]
+        with self._stats_lock:
+            self._batches += 1
+            self._items += len(batch)
+            self._last_batch_size = len(batch)
+            self._max_batch_seen = max(self._max_batch_seen, len(batch))
+            self._total_wait += sum(waits)
+            self._max_wait = max(self._max_wait, max(waits))
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "batches": self._batches,
+                "items": self._items,
+                "avg_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+                "last_batch_size": self._last_batch_size,
+                "max_batch_size": self._max_batch_seen,
+                "avg_wait_ms": round(1000 * self._total_wait / self._items, 3) if self._items else 0.0,
+                "max_wait_ms": round(1000 * self._max_wait, 3),
+                "window_ms": self.window * 1000,
+                "max_batch": self.max_batch,
+            }
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._thread.join(timeout=5)
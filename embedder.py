@@ -1,21 +1,99 @@
 from langchain_core.embeddings import Embeddings
-from sentence_transformers import SentenceTransformer
-from langdetect import detect
+from embed_batcher import MicroBatcher
+from embedding_cache import QueryEmbeddingCache
+from onnx_embedder import EMBED_ONNX_INT8
+import asyncio
 import os
+import numpy as np
 os.environ["TRANSFORMERS_CACHE"] = "./hf_cache"
 
+MODEL_NAME = "paraphrase-multilingual-MiniLM-L12-v2"
+# "torch" (sentence-transformers) or "onnx" (onnxruntime, see onnx_embedder.py)
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch").lower()
+# Concurrent embed_query calls arriving within this window are encoded as one batch (0 disables)
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", "3"))
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "32"))
+# Query-embedding cache: in-memory LRU size (0 disables) and optional on-disk tier
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "10000"))
+EMBED_CACHE_DIR = os.getenv("EMBED_CACHE_DIR")
+EMBED_CACHE_DISK_CAPACITY = int(os.getenv("EMBED_CACHE_DISK_CAPACITY", "200000"))
+
+def load_model(backend: str = EMBED_BACKEND):
+    # Imported lazily so the ONNX backend never loads torch
+    if backend == "onnx":
+        from onnx_embedder import OnnxSentenceEncoder
+        return OnnxSentenceEncoder()
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(MODEL_NAME)
+
+
 class LocalMiniLMEmbedder(Embeddings):
-    def __init__(self):
+    def __init__(self, batch_window_ms: float = EMBED_BATCH_WINDOW_MS, max_batch: int = EMBED_MAX_BATCH,
+                 cache_size: int = EMBED_CACHE_SIZE, cache_dir: str = EMBED_CACHE_DIR, executor=None,
+                 backend: str = EMBED_BACKEND):
         # Load the MiniLM model
-        self.model = SentenceTransformer("paraphrase-multilingual-MiniLM-L12-v2")
+        self.backend = backend
+        self.model = load_model(backend)
+        # Executor used by aembed_query when batching is off (None = the event loop's default)
+        self.executor = executor
+        self.batcher = None
+        if batch_window_ms > 0:
+            self.batcher = MicroBatcher(self._encode, window_ms=batch_window_ms, max_batch=max_batch)
+        self.query_cache = None
+        if cache_size > 0:
+            self.query_cache = QueryEmbeddingCache(
+                # vectors from different backends differ slightly; don't mix them on disk
+                MODEL_NAME if backend == "torch" else f"{MODEL_NAME}-onnx{'-int8' if EMBED_ONNX_INT8 else ''}",
+                self.model.get_sentence_embedding_dimension(),
+                max_items=cache_size,
+                disk_dir=cache_dir,
+                disk_capacity=EMBED_CACHE_DISK_CAPACITY,
+            )
+
+    def _encode(self, texts: list[str]):
+        return self.model.encode(texts, show_progress_bar=False)
+
+    def _encode_query(self, text: str) -> list[float]:
+        if self.batcher is not None:
+            return self.batcher.submit(text).result()
+        return self.model.encode([text])[0].tolist()
 
     def embed_documents(self, texts: list[str]) -> list[list[float]]:
-        clean_texts = []
-        for text in texts:
-            lang = detect(text)
-            clean_texts.append(text)
-        return self.model.encode(clean_texts, show_progress_bar=False).tolist() if clean_texts else []
+        return self.model.encode(texts, show_progress_bar=False).tolist() if texts else []
+
+    def embed_documents_array(self, texts: list[str]) -> np.ndarray:
+        # Same as embed_documents but keeps the (n, dim) float32 array for bulk uploads
+        if not texts:
+            return np.empty((0, self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+        return np.asarray(self.model.encode(texts, show_progress_bar=False), dtype=np.float32)
 
     def embed_query(self, text: str) -> list[float]:
-        lang = detect(text)
-        return self.model.encode([text])[0].tolist()
+        if self.query_cache is not None:
+            vector = self.query_cache.get(text)
+            if vector is not None:
+                return vector
+        vector = self._encode_query(text)
+        if self.query_cache is not None:
+            self.query_cache.put(text, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> list[float]:
+        if self.query_cache is not None:
+            vector = self.query_cache.get(text)
+            if vector is not None:
+                return vector
+        if self.batcher is not None:
+            # The micro-batcher already encodes on its own thread; just await the future
+            vector = await asyncio.wrap_future(self.batcher.submit(text))
+        else:
+            loop = asyncio.get_running_loop()
+            vector = await loop.run_in_executor(self.executor, self._encode_query, text)
+        if self.query_cache is not None:
+            self.query_cache.put(text, vector)
+        return vector
+
+    def close(self):
+        if self.batcher is not None:
+            self.batcher.close()
+        if self.query_cache is not None:
+            self.query_cache.close()
@@ -0,0 +1,195 @@
+import hashlib
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to one directory per process id
+    fcntl = None
+
+
+def normalize_query(text: str) -> str:
+    # "What is Photosynthesis ?" and "what is photosynthesis" share one entry
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.rstrip(" ?.!।")
+
+
+class QueryEmbeddingCache:
+    """
+    normalized query text -> float32 vector.
+    Tier 1 is an in-memory LRU of `max_items` entries.
+    Tier 2 (optional, `disk_dir`) is a memory-mapped .npy ring of `disk_capacity`
+    rows plus an append-only key log, so entries survive restarts.
+    Keys include the model name, so switching models never serves stale vectors.
+    Several workers may share `disk_dir`: each one takes the first free slot-N
+    subdirectory under an exclusive file lock and only ever writes there, and a
+    restarted worker picks a slot (and its entries) back up.
+    """
+
+    def __init__(self, model_name: str, dim: int, max_items: int = 10000,
+                 disk_dir: Optional[str] = None, disk_capacity: int = 200000):
+        self.model_name = model_name
+        self.dim = dim
+        self.max_items = max_items
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._vectors = None
+        self._slot_lock = None
+        self._key_to_row = {}
+        self._row_to_key = {}
+        if disk_dir:
+            self._open_disk(disk_dir, disk_capacity)
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha1(f"{self.model_name}\0{normalize_query(text)}".encode("utf-8")).hexdigest()
+
+    def _open_disk(self, disk_dir: str, capacity: int):
+        safe_model = re.sub(r"[^A-Za-z0-9_.-]", "_", self.model_name)
+        path = self._claim_slot(os.path.join(disk_dir, f"{safe_model}-{self.dim}"))
+        vectors_path = os.path.join(path, "vectors.npy")
+        self._log_path = os.path.join(path, "keys.log")
+
+        if os.path.exists(vectors_path):
+            self._vectors = np.load(vectors_path, mmap_mode="r+")
+        else:
+            self._vectors = np.lib.format.open_memmap(vectors_path, mode="w+", dtype=np.float32, shape=(capacity, self.dim))
+        self._capacity = self._vectors.shape[0]
+
+        # Replay the key log: the last key written to a row owns it
+        writes = 0
+        last_row = -1
+        if os.path.exists(self._log_path):
+            with open(self._log_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) != 2:
+                        continue
+                    row, key = int(parts[0]), parts[1]
+                    if row >= self._capacity:
+                        continue
+                    old = self._row_to_key.get(row)
+                    if old is not None:
+                        self._key_to_row.pop(old, None)
+                    self._row_to_key[row] = key
+                    self._key_to_row[key] = row
+                    last_row = row
+                    writes += 1
+        self._next_row = (last_row + 1) % self._capacity
+        self._log_lines = writes
+        if self._log_lines > 2 * self._capacity:
+            self._compact_log()
+        self._log = open(self._log_path, "a", encoding="utf-8")
+
+    def _claim_slot(self, base: str) -> str:
+        # The vectors file and key log are not safe to share between processes
+        if fcntl is None:
+            path = os.path.join(base, f"pid-{os.getpid()}")
+            os.makedirs(path, exist_ok=True)
+            return path
+        slot = 0
+        while True:
+            path = os.path.join(base, f"slot-{slot}")
+            os.makedirs(path, exist_ok=True)
+            lock = open(os.path.join(path, "lock"), "a")
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock.close()
+                slot += 1
+                continue
+            self._slot_lock = lock  # held until close() or process exit
+            return path
+
+    def _compact_log(self):
+        # Rewrite rows oldest-first, so the ring position stays correct after a restart
+        order = sorted(self._row_to_key, key=lambda row: (row - self._next_row) % self._capacity)
+        tmp_path = self._log_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for row in order:
+                f.write(f"{row} {self._row_to_key[row]}\n")
+        os.replace(tmp_path, self._log_path)
+        self._log_lines = len(order)
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+
+    def get(self, text: str) -> Optional[list[float]]:
+        key = self._key(text)
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return vector.tolist()
+
+            row = self._key_to_row.get(key)
+            if row is not None:
+                vector = np.array(self._vectors[row], dtype=np.float32)
+                self._remember(key, vector)
+                self.disk_hits += 1
+                return vector.tolist()
+
+            self.misses += 1
+            return None
+
+    def put(self, text: str, vector):
+        key = self._key(text)
+        vector = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            self._remember(key, vector)
+            if self._vectors is None or key in self._key_to_row:
+                return
+
+            row = self._next_row
+            old = self._row_to_key.get(row)
+            if old is not None:
+                self._key_to_row.pop(old, None)
+            self._vectors[row] = vector
+            self._row_to_key[row] = key
+            self._key_to_row[key] = row
+            self._log.write(f"{row} {key}\n")
+            self._log.flush()
+            self._log_lines += 1
+            self._next_row = (row + 1) % self._capacity
+            if self._log_lines > 2 * self._capacity:
+                self._log.close()
+                self._compact_log()
+                self._log = open(self._log_path, "a", encoding="utf-8")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_items": len(self._memory),
+                "disk_items": len(self._key_to_row),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+    def close(self):
+        with self._lock:
+            if self._vectors is not None:
+                self._vectors.flush()
+                self._log.close()
+                self._vectors = None
+                self._key_to_row.clear()
+                self._row_to_key.clear()
+            if self._slot_lock is not None:
+                self._slot_lock.close()
+                self._slot_lock = None
@@ -0,0 +1,126 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from uuid import uuid4
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Optional sqlite file so job statuses survive restarts (unset = memory only)
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH")
+# Finished jobs are forgotten after JOB_RETENTION seconds, or beyond JOB_MAX_FINISHED of them
+JOB_RETENTION = int(os.getenv("JOB_RETENTION", str(24 * 3600)))
+JOB_MAX_FINISHED = int(os.getenv("JOB_MAX_FINISHED", "1000"))
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class JobQueue:
+    """
+    Small in-process background job queue.
+    Jobs submitted with the same key while one is queued/running are coalesced:
+    the caller gets the existing job id instead of starting duplicate work.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, db_path: str = JOBS_DB_PATH,
+                 retention: int = JOB_RETENTION, max_finished: int = JOB_MAX_FINISHED):
+        self.retention = retention
+        self.max_finished = max_finished
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._inflight = {}  # key -> job id
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, key TEXT, data TEXT NOT NULL)"
+            )
+            # Anything still queued/running belonged to a process that is gone
+            for job_id, data in self._db.execute("SELECT id, data FROM jobs").fetchall():
+                job = json.loads(data)
+                if job["status"] in ACTIVE_STATUSES:
+                    job["status"] = "interrupted"
+                self._jobs[job_id] = job
+            self._evict()
+            self._db.commit()
+
+    def _save(self, job: dict):
+        if self._db is not None:
+            self._db.execute(
+                "INSERT OR REPLACE INTO jobs (id, key, data) VALUES (?, ?, ?)",
+                (job["id"], job["key"], json.dumps(job, ensure_ascii=False)),
+            )
+            self._db.commit()
+
+    def _update(self, job_id: str, **fields):
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(fields, updated_at=time.time())
+            self._save(job)
+            if job["status"] not in ACTIVE_STATUSES:
+                self._evict()
+
+    def _evict(self):
+        """Drop finished jobs past the retention age, then the oldest beyond max_finished (lock held)."""
+        cutoff = time.time() - self.retention
+        finished = sorted(
+            (job for job in self._jobs.values() if job["status"] not in ACTIVE_STATUSES),
+            key=lambda job: job["updated_at"],
+        )
+        excess = max(0, len(finished) - self.max_finished)
+        expired = [job["id"] for i, job in enumerate(finished) if i < excess or job["updated_at"] < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+        if expired and self._db is not None:
+            self._db.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in expired])
+            self._db.commit()
+
+    def submit(self, key: str, fn, *args, **kwargs) -> tuple[str, bool]:
+        """
+        Queue fn(*args, progress=callback, **kwargs). Returns (job_id, coalesced).
+        """
+        with self._lock:
+            existing = self._inflight.get(key)
+            if existing is not None:
+                return existing, True
+
+            now = time.time()
+            job = {
+                "id": uuid4().hex,
+                "key": key,
+                "status": "queued",
+                "stage": None,
+                "result": None,
+                "error": None,
+                "created_at": now,
+                "updated_at": now,
+            }
+            self._jobs[job["id"]] = job
+            self._inflight[key] = job["id"]
+            self._save(job)
+
+        self._executor.submit(self._run, job["id"], key, fn, args, kwargs)
+        return job["id"], False
+
+    def _run(self, job_id: str, key: str, fn, args, kwargs):
+        self._update(job_id, status="running")
+        try:
+            result = fn(*args, progress=lambda stage: self._update(job_id, stage=stage), **kwargs)
+            self._update(job_id, status="failed" if "error" in (result or {}) else "completed", result=result)
+        except Exception as e:
+            print(f"❌ Job {job_id} ({key}) failed: {e}")
+            self._update(job_id, status="failed", error=str(e))
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def get(self, job_id: str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+        if self._db is not None:
+            self._db.close()
@@ -0,0 +1,30 @@
+import os
+from functools import lru_cache
+
+# Language detection is opt-in: it is slow and only needed to tag chunks with a `lang` payload
+DETECT_LANG = os.getenv("EMBED_DETECT_LANG", "0").lower() in ("1", "true", "yes")
+
+_detector_ready = False
+
+
+@lru_cache(maxsize=4096)
+def detect_language(text: str) -> str:
+    """
+    Return the ISO code langdetect picks for `text`, or "unknown" when the text
+    is too short / has no letters. Results are cached and deterministic.
+    """
+    global _detector_ready
+    from langdetect import DetectorFactory, detect
+    from langdetect.lang_detect_exception import LangDetectException
+
+    if not _detector_ready:
+        # langdetect is randomised unless seeded
+        DetectorFactory.seed = 0
+        _detector_ready = True
+
+    if not any(ch.isalpha() for ch in text):
+        return "unknown"
+    try:
+        return detect(text)
+    except LangDetectException:
+        return "unknown"
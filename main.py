@@ -1,22 +1,66 @@
-from fastapi import FastAPI, Query
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from yt_search import get_top_videos
-from chapter_upserter import upsert_chapter_text
-import uvicorn
-from chat_ncert import run_chatbot
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
+from typing import Optional
 import os
-from chat_title import chat_title
+import json
+import time
+import asyncio
+import registry
+import startup
+
+# Route modules (torch, fitz, qdrant_client, langchain_groq) are imported
+# inside the handlers and warmed by startup.warm_up, so the server listens right away.
 
 os.environ["TRANSFORMERS_CACHE"] = "./hf_cache"
 os.environ["HF_HOME"] = "./hf_home"
 
+class ChatScope(BaseModel):
+    # any combination narrows the search; see retrieval.scope_filter
+    cids: Optional[list[str]] = None
+    class_num: Optional[int] = None
+    subject: Optional[str] = None
+
+    def narrowing(self) -> dict:
+        # only the fields that narrow the search; "cids": [] or "subject": "" don't
+        scope = {}
+        cids = [cid for cid in self.cids or [] if cid]
+        if cids:
+            scope["cids"] = cids
+        if self.class_num is not None:
+            scope["class_num"] = self.class_num
+        if self.subject and self.subject.strip():
+            scope["subject"] = self.subject
+        return scope
+
 class ChatRequest(BaseModel):
     messages: list[dict]
     user_input: str
-    cid: str
+    cid: Optional[str] = None
+    scope: Optional[ChatScope] = None
+
+    def retrieval_scope(self):
+        scope = self.scope.narrowing() if self.scope is not None else {}
+        if not scope and not self.cid:
+            raise HTTPException(status_code=422, detail="Either cid or a non-empty scope is required")
+        return scope or self.cid
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the embedder, Qdrant client and LLM clients in the background; /readyz reports when done
+    warm_up = asyncio.create_task(asyncio.to_thread(startup.warm_up))
+    yield
+    # Stop after the current step and let it finish, so aclose doesn't close half-built components
+    startup.state.cancelled.set()
+    try:
+        await asyncio.wait_for(asyncio.shield(warm_up), timeout=startup.STARTUP_SHUTDOWN_TIMEOUT)
+    except asyncio.TimeoutError:
+        print("⚠️ Warm-up still running at shutdown; closing components anyway")
+    await registry.aclose()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -26,29 +70,173 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if startup.STARTUP_PROFILE:
+    @app.middleware("http")
+    async def time_first_requests(request: Request, call_next):
+        started = time.perf_counter()
+        response = await call_next(request)
+        route = request.scope.get("route")
+        startup.state.record_first_request(getattr(route, "path", request.url.path), time.perf_counter() - started)
+        return response
+
+    @app.get("/startup-profile")
+    def startup_profile():
+        return startup.state.as_dict()
+
+@app.get("/healthz")
+def liveness():
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readiness():
+    state = startup.state
+    body = {"ready": state.ready, "stage": state.stage, "error": state.error}
+    return body if state.ready else JSONResponse(body, status_code=503)
+
 @app.get("/yt-search")
-async def yt_search(query: str = Query(...)):
+def yt_search(query: str = Query(...)):
+    # sync route: runs in the threadpool, where identical concurrent queries are coalesced
+    from yt_search import get_top_videos
     return {"results": get_top_videos(query)}
 
+@app.get("/chapter-videos")
+def chapter_videos_endpoint(
+    class_num: int = Query(..., ge=1, le=12),
+    subject: str = Query(...),
+    chapter: str = Query(...),
+    limit: int = Query(3, ge=1, le=10)
+):
+    # served from the precomputed store; chapters not stored yet fall back to a live search
+    from chapter_videos import chapter_videos
+    return chapter_videos(class_num, subject, chapter, limit)
+
+@app.get("/chapters")
+def list_chapters(
+    class_num: int = Query(None, ge=1, le=12),
+    subject: str = Query(None),
+    q: str = Query(None),
+    limit: int = Query(20, ge=1, le=500)
+):
+    from ncert_parser import get_chapter_index
+    results = get_chapter_index().search(class_num, subject, q, limit=limit)
+    return {"results": [{**entry.as_dict(), "score": score} for entry, score in results]}
+
 @app.get("/upsert-chapter")
 def upsert_chapter(
     class_num: int = Query(..., ge=1, le=12),
     subject: str = Query(...),
-    chapter: str = Query(...)
+    chapter: str = Query(...),
+    wait: bool = Query(False)
 ):
-    result = upsert_chapter_text(class_num, subject, chapter)
-    return result
+    from chapter_upserter import upsert_chapter_text
+    from qdrant_utils import chapter_id
+
+    if wait:
+        # old blocking behaviour
+        return upsert_chapter_text(class_num, subject, chapter)
+
+    cid = chapter_id(class_num, subject, chapter)
+    # Requests for a chapter that is already queued/running share that job
+    job_id, coalesced = registry.get_job_queue().submit(cid, upsert_chapter_text, class_num, subject, chapter)
+    return {"job_id": job_id, "cid": cid, "coalesced": coalesced, "status": registry.get_job_queue().get(job_id)["status"]}
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    job = registry.get_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job id")
+    return job
+
+@app.post("/bulk-ingest")
+async def bulk_ingest_endpoint(
+    class_num: int = Query(None, ge=1, le=12),
+    subject: str = Query(None),
+    all: bool = Query(False)
+):
+    # an unfiltered run queues the whole corpus (thousands of PDFs); make that explicit
+    if class_num is None and not subject and not all:
+        raise HTTPException(status_code=422, detail="Pass class_num and/or subject, or all=true to ingest every chapter")
+    from bulk_ingest import start_bulk_ingest
+    # a filter that already has a running job shares it
+    job, coalesced = start_bulk_ingest(class_num, subject)
+    return {"job_id": job.id, "coalesced": coalesced, "status": job.status}
+
+@app.get("/bulk-ingest/{job_id}")
+def bulk_ingest_status(job_id: str):
+    from bulk_ingest import bulk_jobs
+    job = bulk_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job id")
+    return job.progress()
+
+def _load_chat_ncert():
+    import chat_ncert
+    chat_ncert.prepare_components()
+    return chat_ncert
+
+async def chat_module():
+    # Until the warm-up is done, importing chat_ncert and building its components can wait on
+    # the warm-up thread (import lock, per-key build locks); do that off the event loop
+    if not startup.state.ready:
+        return await asyncio.to_thread(_load_chat_ncert)
+    import chat_ncert
+    return chat_ncert
 
 @app.post("/chat-ncert")
-def chat_ncert_endpoint(payload: ChatRequest):
-    return {"response": run_chatbot(payload.messages, payload.user_input, payload.cid)}
+async def chat_ncert_endpoint(payload: ChatRequest):
+    scope = payload.retrieval_scope()
+    chat_ncert = await chat_module()
+    return {"response": await chat_ncert.arun_chatbot(payload.messages, payload.user_input, scope=scope)}
+
+@app.post("/chat-ncert/stream")
+async def chat_ncert_stream_endpoint(payload: ChatRequest):
+    scope = payload.retrieval_scope()
+    astream_chatbot = (await chat_module()).astream_chatbot
+
+    async def event_stream():
+        async for event, data in astream_chatbot(payload.messages, payload.user_input, scope=scope):
+            yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/metrics/embedder")
+def embedder_metrics():
+    embedder = registry.get_embedder()
+    return {
+        "batching": embedder.batcher.stats() if embedder.batcher is not None else None,
+        "query_cache": embedder.query_cache.stats() if embedder.query_cache is not None else None,
+    }
+
+@app.get("/metrics/reranker")
+def reranker_metrics():
+    reranker = registry.get_reranker()
+    return reranker.stats() if reranker is not None else {"enabled": False}
+
+@app.get("/metrics/answer-cache")
+def answer_cache_metrics():
+    answer_cache = registry.get_answer_cache()
+    return answer_cache.stats() if answer_cache is not None else {"backend": "off"}
+
+@app.get("/metrics/yt-search")
+def yt_search_metrics():
+    return registry.get_youtube_search().stats()
+
+@app.get("/metrics/chapter-videos")
+def chapter_videos_metrics():
+    return registry.get_chapter_videos().stats()
 
 @app.get("/chat-title")
 def chat_title_endpoint(
     user_input: str = Query(...),
     llm_response: str = Query(...)
 ):
+    from chat_title import chat_title
     return {"title": chat_title(user_input=user_input, llm_response=llm_response)}
 
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
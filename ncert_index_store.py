@@ -0,0 +1,43 @@
+"""
+Loader for ncert_index_final.json.
+
+Entries are kept as lightweight ChapterRecord objects (slots, no per-entry dict).
+Every lookup goes through ChapterIndex's in-memory maps, so the whole file is read
+once at startup; parsing the JSON is as fast as reading a compiled copy would be.
+"""
+import json
+import os
+
+JSON_PATH = os.getenv("NCERT_INDEX_JSON", "ncert_index_final.json")
+
+
+class ChapterRecord:
+    __slots__ = ("class_num", "subject", "chapter", "chapter_number", "pdf_url")
+
+    def __init__(self, class_num: int, subject: str, chapter: str, chapter_number, pdf_url: str):
+        self.class_num = class_num
+        self.subject = subject
+        self.chapter = chapter
+        self.chapter_number = chapter_number
+        self.pdf_url = pdf_url
+
+    def as_dict(self) -> dict:
+        # same shape as the entries in ncert_index_final.json
+        return {
+            "class": self.class_num,
+            "subject": self.subject,
+            "chapter": self.chapter,
+            "chapter_number": self.chapter_number,
+            "pdf_url": self.pdf_url,
+        }
+
+    def __repr__(self):
+        return f"ChapterRecord({self.class_num}, {self.subject!r}, {self.chapter!r})"
+
+
+def load_chapters(json_path: str = JSON_PATH) -> list[ChapterRecord]:
+    with open(json_path, "r", encoding="utf-8") as f:
+        return [
+            ChapterRecord(e["class"], e["subject"], e["chapter"], e.get("chapter_number"), e["pdf_url"])
+            for e in json.load(f)
+        ]
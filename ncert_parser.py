@@ -1,42 +1,270 @@
-import json
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
 import requests
 import fitz  # PyMuPDF
-import io
+from ncert_index_store import ChapterRecord, load_chapters
+
+CHAPTER_PREFIX_RE = re.compile(r"^(?:chapter|unit|lesson|ch)\.?\s*(\d+)\s*[:.\-]?\s*")
+CHAPTER_NUMBER_RE = re.compile(r"^(?:(?:chapter|unit|lesson|ch)\.?\s*)?(\d+)$")
+
+
+def normalize_title(text: str) -> str:
+    # "Chapter 11: Nature’s Treasures" -> "chapter 11 natures treasures"
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = text.replace("’", "").replace("'", "")
+    text = re.sub(r"[^\w\s]", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def strip_chapter_prefix(title: str) -> str:
+    return CHAPTER_PREFIX_RE.sub("", title, count=1).strip()
+
+
+class ChapterIndex:
+    """
+    Lookup structures over the NCERT chapter list, built once:
+      - entries per (class, subject)
+      - exact lookup by (class, subject, chapter_number)
+      - normalized title (with and without the "Chapter N:" prefix)
+      - token sets for ranked fuzzy matching
+    """
+
+    def __init__(self, entries: list[ChapterRecord]):
+        self.entries = entries
+        self.by_subject = {}
+        self.by_number = {}
+        self.by_title = {}
+        self.subjects_by_class = {}
+        self.titles = {}
+        self.tokens = {}
+
+        for entry in entries:
+            key = (entry.class_num, entry.subject)
+            self.by_subject.setdefault(key, []).append(entry)
+            subjects = self.subjects_by_class.setdefault(entry.class_num, [])
+            if entry.subject not in subjects:
+                subjects.append(entry.subject)
+            if entry.chapter_number is not None:
+                self.by_number.setdefault((*key, entry.chapter_number), entry)
+
+            title = normalize_title(entry.chapter)
+            self.by_title.setdefault((*key, title), entry)
+            self.by_title.setdefault((*key, strip_chapter_prefix(title)), entry)
+            self.titles[id(entry)] = title
+            self.tokens[id(entry)] = frozenset(title.split())
+
+    def resolve_subjects(self, class_num: int, subject: str) -> list[str]:
+        """Exact subject if it exists, otherwise every subject containing it (e.g. "hindi")."""
+        subject = subject.lower().strip()
+        subjects = self.subjects_by_class.get(class_num, [])
+        if subject in subjects:
+            return [subject]
+        return [s for s in subjects if subject in s]
+
+    def score(self, entry: ChapterRecord, query: str, query_tokens: frozenset, query_number) -> float:
+        if not query_tokens:
+            return 0.0
+        title = self.titles[id(entry)]
+        tokens = self.tokens[id(entry)]
+        common = len(query_tokens & tokens)
+        score = 0.6 * common / len(query_tokens) + 0.4 * common / len(query_tokens | tokens)
+        if query and query in title:
+            score += 0.5
+        if query_number is not None and entry.chapter_number == query_number:
+            score += 0.3
+        return score
+
+    def search(self, class_num: int = None, subject: str = None, query: str = None, limit: int = 20) -> list[tuple[ChapterRecord, float]]:
+        if class_num is not None and subject:
+            candidates = [e for s in self.resolve_subjects(class_num, subject) for e in self.by_subject[(class_num, s)]]
+        else:
+            candidates = [
+                e for e in self.entries
+                if (class_num is None or e.class_num == class_num)
+                and (not subject or subject.lower().strip() in e.subject)
+            ]
+        if not query:
+            return [(e, 1.0) for e in candidates[:limit]]
+
+        query = normalize_title(query)
+        number = re.match(r"^(?:chapter|unit|lesson|ch)?\s*(\d+)\b", query)
+        query_number = int(number.group(1)) if number else None
+        query_tokens = frozenset(query.split())
+        scored = [(e, self.score(e, query, query_tokens, query_number)) for e in candidates]
+        scored = [(e, round(s, 4)) for e, s in scored if s > 0]
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored[:limit]
+
+    def find(self, class_num: int, subject: str, chapter_name: str, min_score: float = 0.5):
+        subjects = self.resolve_subjects(class_num, subject)
+        query = normalize_title(chapter_name)
+
+        number = CHAPTER_NUMBER_RE.match(query)
+        for s in subjects:
+            if number:
+                entry = self.by_number.get((class_num, s, int(number.group(1))))
+            else:
+                entry = self.by_title.get((class_num, s, query))
+            if entry is not None:
+                return entry
+
+        ranked = self.search(class_num, subject, chapter_name, limit=1)
+        if ranked and ranked[0][1] >= min_score:
+            return ranked[0][0]
+        return None
+
+
+_chapter_index = None
+_chapter_index_lock = threading.Lock()
+
+
+def get_chapter_index() -> ChapterIndex:
+    # Built lazily on first use (or during app warm-up), not at import
+    global _chapter_index
+    if _chapter_index is None:
+        with _chapter_index_lock:
+            if _chapter_index is None:
+                _chapter_index = ChapterIndex(load_chapters())
+    return _chapter_index
+
+
+def find_chapter(class_num: int, subject: str, chapter_name: str):
+    return get_chapter_index().find(class_num, subject, chapter_name)
 
-with open("ncert_index_final.json", "r", encoding="utf-8") as f:
-    ncert_index = json.load(f)
 
 def find_pdf_url(class_num: int, subject: str, chapter_name: str):
-    subject = subject.lower().strip()
-    chapter_name = chapter_name.strip()
+    entry = find_chapter(class_num, subject, chapter_name)
+    return entry.pdf_url if entry else None
 
-    for entry in ncert_index:
-        if (entry["class"] == class_num and
-            subject in entry["subject"] and
-            chapter_name.lower() in entry["chapter"].lower()):
-            return entry["pdf_url"]
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Below this many pages a process pool costs more than it saves
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "24"))
+PDF_DOWNLOAD_CHUNK = 256 * 1024
 
-    return None
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
 
-def extract_text_from_pdf_url(pdf_url: str) -> str:
+
+def get_pdf_pool() -> ProcessPoolExecutor:
+    global _pdf_pool
+    if _pdf_pool is None:
+        with _pdf_pool_lock:
+            if _pdf_pool is None:
+                # spawn: forking a threaded server process is not safe
+                _pdf_pool = ProcessPoolExecutor(
+                    max_workers=PDF_EXTRACT_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _pdf_pool
+
+
+def download_pdf(pdf_url: str) -> str:
+    """
+    Stream the PDF to a temp file and return its path (the caller deletes it).
+    A named file on disk lets pool workers open it directly, instead of each one
+    being sent the whole PDF.
+    """
+    print(f"Downloading PDF: {pdf_url}")
+    path = None
     try:
-        print(f"Downloading PDF: {pdf_url}")
-        response = requests.get(pdf_url, timeout=15)
-        response.raise_for_status()
+        with requests.get(pdf_url, timeout=15, stream=True) as response:
+            response.raise_for_status()
+            with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+                path = f.name
+                for chunk in response.iter_content(chunk_size=PDF_DOWNLOAD_CHUNK):
+                    f.write(chunk)
+        return path
+    except BaseException:
+        # don't leave a partial download behind
+        if path is not None and os.path.exists(path):
+            os.remove(path)
+        raise
+
+
+def page_text(page) -> str:
+    return page.get_text()
+
+
+def page_lines(page) -> list[tuple[str, float, bool, bool]]:
+    """
+    Lines of a page as (text, font size, bold, starts a new block) for chunker.chunk_pages.
+    Plain tuples keep the result cheap to send back from pool workers.
+    """
+    lines = []
+    for block in page.get_text("dict", flags=fitz.TEXTFLAGS_TEXT)["blocks"]:
+        new_block = True
+        for line in block.get("lines", []):
+            spans = [span for span in line["spans"] if span["text"].strip()]
+            if not spans:
+                continue
+            text = "".join(span["text"] for span in line["spans"]).strip()
+            size = round(max(span["size"] for span in spans), 1)
+            bold = all(span["flags"] & fitz.TEXT_FONT_BOLD for span in spans)
+            lines.append((text, size, bold, new_block))
+            new_block = False
+    return lines
+
+
+def extract_page_range(pdf_path: str, start: int, stop: int, page_fn=page_text) -> list[tuple[int, object]]:
+    # Runs in a pool worker: each worker opens the document itself
+    with fitz.open(pdf_path) as doc:
+        return [(i + 1, page_fn(doc[i])) for i in range(start, stop)]
+
+
+def extract_all_pages(pdf_path: str, page_fn=page_text) -> list[tuple[int, object]]:
+    # Whole document in one worker (bulk ingest parallelises across chapters instead)
+    with fitz.open(pdf_path) as doc:
+        return [(i + 1, page_fn(page)) for i, page in enumerate(doc)]
 
-        pdf_data = io.BytesIO(response.content)
-        doc = fitz.open(stream=pdf_data, filetype="pdf")
 
-        full_text = ""
-        for page in doc:
-            full_text += page.get_text()
+def extract_pages_from_pdf(pdf_path: str, page_fn=page_text) -> list[tuple[int, object]]:
+    """
+    Return [(page_number, page_fn(page)), ...] with 1-based page numbers:
+    page text by default, or page_lines for the structure-aware chunker.
+    """
+    with fitz.open(pdf_path) as doc:
+        page_count = doc.page_count
+        if page_count < PDF_PARALLEL_MIN_PAGES or PDF_EXTRACT_WORKERS <= 1:
+            return [(i + 1, page_fn(page)) for i, page in enumerate(doc)]
 
-        doc.close()
-        return full_text.strip()
+    step = -(-page_count // PDF_EXTRACT_WORKERS)
+    ranges = [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+    pool = get_pdf_pool()
+    futures = [pool.submit(extract_page_range, pdf_path, start, stop, page_fn) for start, stop in ranges]
+    return [page for future in futures for page in future.result()]
 
+
+def extract_pages_from_pdf_url(pdf_url: str, page_fn=page_text) -> list[tuple[int, object]]:
+    try:
+        pdf_path = download_pdf(pdf_url)
+    except Exception as e:
+        print(f"Failed to download PDF: {e}")
+        return []
+    try:
+        return extract_pages_from_pdf(pdf_path, page_fn)
     except Exception as e:
         print(f"Failed to extract text: {e}")
-        return ""
+        return []
+    finally:
+        os.remove(pdf_path)
+
+
+def join_pages(pages: list[tuple[int, str]]) -> str:
+    return "".join(text for _, text in pages).strip()
+
+
+def extract_text_from_pdf(pdf_path: str) -> str:
+    # Local-file variant, handy for testing without network
+    return join_pages(extract_pages_from_pdf(pdf_path))
+
+
+def extract_text_from_pdf_url(pdf_url: str) -> str:
+    return join_pages(extract_pages_from_pdf_url(pdf_url))
 
 if __name__ == "__main__":
     class_num = int(input("Enter class num: "))
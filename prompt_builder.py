@@ -0,0 +1,168 @@
+"""
+Token-budgeted pieces of the chat prompt: recent history and NCERT context.
+
+Token counts are estimates (no tokenizer for the Groq models ships with the app):
+~4 characters per token for Latin text and ~2 for Devanagari and other scripts,
+which errs on the high side for English.
+"""
+import math
+import os
+import re
+
+# Whole prompt (instructions + history + context + question) and the share history may use
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))
+PROMPT_HISTORY_TOKENS = int(os.getenv("PROMPT_HISTORY_TOKENS", "600"))
+# Context the prompt always keeps when there are retrieved chunks, even over the budget
+PROMPT_MIN_CONTEXT_TOKENS = int(os.getenv("PROMPT_MIN_CONTEXT_TOKENS", "200"))
+# The splitter overlaps neighbouring chunks by at most 200 characters
+MAX_CHUNK_OVERLAP = 200
+MIN_CHUNK_OVERLAP = 20
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    ascii_chars = sum(1 for ch in text if ch < "\x80")
+    return math.ceil(ascii_chars / 4 + (len(text) - ascii_chars) / 2)
+
+
+def truncate_to_tokens(text: str, max_tokens: int, from_start: bool = False) -> str:
+    """Cut `text` to roughly `max_tokens`, at a whitespace boundary; keeps the end if from_start."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        piece = text[-mid:] if from_start else text[:mid]
+        if count_tokens(piece) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    if from_start:
+        piece = text[-lo:]
+        cut = piece.find(" ")
+        return "…" + (piece[cut + 1:] if 0 <= cut < 40 else piece)
+    piece = text[:lo]
+    cut = piece.rfind(" ")
+    return (piece[:cut] if cut > len(piece) - 40 else piece) + "…"
+
+
+def build_history(messages: list, max_tokens: int = PROMPT_HISTORY_TOKENS, max_turns: int = None) -> str:
+    """
+    Most recent user/assistant pairs that fit in `max_tokens`, oldest first.
+    The newest turn is truncated rather than dropped when it alone is too long.
+    """
+    pairs = []
+    for i in range(len(messages) - 2, -1, -2):
+        pairs.append(f"User: {messages[i]['content']}\nAssistant: {messages[i + 1]['content']}")
+        if max_turns is not None and len(pairs) >= max_turns:
+            break
+
+    kept, used = [], 0
+    for text in pairs:
+        tokens = count_tokens(text) + 1
+        if used + tokens > max_tokens:
+            if not kept:
+                kept.append(truncate_to_tokens(text, max_tokens, from_start=True))
+            break
+        kept.append(text)
+        used += tokens
+    return "\n".join(reversed(kept))
+
+
+def merge_overlap(first: str, second: str):
+    """`second` appended to `first` without the text they share at the seam, or None."""
+    for size in range(min(len(first), len(second), MAX_CHUNK_OVERLAP), MIN_CHUNK_OVERLAP - 1, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    return None
+
+
+def merge_chunks(docs: list) -> list[dict]:
+    """
+    Merge adjacent chunks of the same chapter (consecutive chunk_index) into one block,
+    drop repeated text, and return blocks ordered by their best-ranked chunk.
+    """
+    blocks = []
+    by_position = {}
+    for rank, doc in enumerate(docs):
+        meta = getattr(doc, "metadata", {}) or {}
+        text = getattr(doc, "page_content", str(doc)).strip()
+        blocks.append({
+            "rank": rank,
+            "cid": meta.get("cid"),
+            "first": meta.get("chunk_index"),
+            "last": meta.get("chunk_index"),
+            "page_start": meta.get("page_start"),
+            "page_end": meta.get("page_end"),
+            "section": meta.get("section"),
+            "text": text,
+        })
+
+    # Fold each chunk into the block that ends right before it
+    ordered = sorted(
+        (b for b in blocks if b["cid"] is not None and b["first"] is not None),
+        key=lambda b: (b["cid"], b["first"]),
+    )
+    merged = [b for b in blocks if b["cid"] is None or b["first"] is None]
+    for block in ordered:
+        previous = by_position.get((block["cid"], block["first"] - 1))
+        if previous is not None:
+            previous["text"] = merge_overlap(previous["text"], block["text"]) or previous["text"] + "\n" + block["text"]
+            previous["last"] = block["last"]
+            previous["rank"] = min(previous["rank"], block["rank"])
+            if block["page_end"] is not None:
+                previous["page_end"] = block["page_end"]
+            by_position[(block["cid"], block["last"])] = previous
+        else:
+            merged.append(block)
+            by_position[(block["cid"], block["last"])] = block
+
+    # Drop blocks whose text is already contained in a better-ranked one (repeated exercise lists)
+    result, seen = [], []
+    for block in sorted(merged, key=lambda b: b["rank"]):
+        normalized = _WHITESPACE_RE.sub(" ", block["text"]).lower()
+        if any(normalized in other for other in seen):
+            continue
+        seen.append(normalized)
+        result.append(block)
+    return result
+
+
+def format_block(block: dict) -> str:
+    start, end = block["page_start"], block["page_end"]
+    labels = []
+    if start is not None:
+        labels.append(f"Page {start}" if start == end or end is None else f"Pages {start}-{end}")
+    if block.get("section"):
+        labels.append(f"Section: {block['section']}")
+    if not labels:
+        return block["text"]
+    return f"[{' | '.join(labels)}]\n{block['text']}"
+
+
+def build_context(docs: list, max_tokens: int) -> tuple[str, int]:
+    """
+    NCERT context that fits in `max_tokens`: merged blocks in relevance order, the last
+    one truncated if it only partly fits. The top block is always kept (cut to at least
+    PROMPT_MIN_CONTEXT_TOKENS), so the LLM never answers without context.
+    Returns (text, number of blocks used).
+    """
+    parts, used = [], 0
+    for block in merge_chunks(docs):
+        text = format_block(block)
+        tokens = count_tokens(text) + 1
+        if used + tokens > max_tokens:
+            remaining = max_tokens - used
+            if not parts:
+                parts.append(truncate_to_tokens(text, max(remaining, PROMPT_MIN_CONTEXT_TOKENS) - 1))
+            elif remaining >= 100:
+                parts.append(truncate_to_tokens(text, remaining - 1))
+            break
+        parts.append(text)
+        used += tokens
+    return "\n\n".join(parts), len(parts)
@@ -1,46 +1,287 @@
+from qdrant_client.http.models import (
+    PointStruct, Distance, VectorParams, ScoredPoint, HnswConfigDiff, OptimizersConfigDiff, PayloadSchemaType,
+    ScalarQuantization, ScalarQuantizationConfig, ScalarType, BinaryQuantization, BinaryQuantizationConfig,
+    Disabled, VectorParamsDiff, SearchParams, QuantizationSearchParams, SparseVectorParams, Modifier,
+    Filter, FieldCondition, MatchValue, MatchAny, Range, FilterSelector, IsEmptyCondition, PayloadField,
+)
+from uuid import NAMESPACE_URL, uuid5
 import os
-from qdrant_client import QdrantClient
-from qdrant_client.http.models import PointStruct, Distance, VectorParams, ScoredPoint
-from uuid import uuid4
+import threading
+import numpy as np
+import registry
 
-QDRANT_URL = os.getenv("QDRANT_URL")
-QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
 COLLECTION_NAME = "ncert-chapters"
+POINT_NAMESPACE = uuid5(NAMESPACE_URL, "ncert-chapters")
+# Points per upload request and parallel upload workers used by insert_vectors
+QDRANT_UPLOAD_BATCH = int(os.getenv("QDRANT_UPLOAD_BATCH", "64"))
+QDRANT_UPLOAD_PARALLEL = int(os.getenv("QDRANT_UPLOAD_PARALLEL", "1"))
 
-client = QdrantClient(
-    url=QDRANT_URL,
-    api_key=QDRANT_API_KEY,
-)
+# Collection layout, applied once per process by ensure_collection()
+QDRANT_HNSW_M = int(os.getenv("QDRANT_HNSW_M", "16"))
+QDRANT_HNSW_EF_CONSTRUCT = int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", "100"))
+QDRANT_ON_DISK = os.getenv("QDRANT_ON_DISK", "0") == "1"
+QDRANT_INDEXING_THRESHOLD = int(os.getenv("QDRANT_INDEXING_THRESHOLD", "20000"))
+QDRANT_MEMMAP_THRESHOLD = int(os.getenv("QDRANT_MEMMAP_THRESHOLD", "0")) or None
+# Vector quantization: none, scalar (int8) or binary; originals are kept for rescoring
+QDRANT_QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "none").lower()
+QDRANT_QUANTIZATION_ALWAYS_RAM = os.getenv("QDRANT_QUANTIZATION_ALWAYS_RAM", "1") == "1"
+# Search-time handling of quantized vectors
+QDRANT_SEARCH_RESCORE = os.getenv("QDRANT_SEARCH_RESCORE", "1") == "1"
+QDRANT_SEARCH_OVERSAMPLING = float(os.getenv("QDRANT_SEARCH_OVERSAMPLING", "2.0"))
+# Hybrid retrieval: named "dense" + "sparse" (BM25) vectors instead of one unnamed dense vector.
+# Only applies to a newly created collection; an existing one has to be dropped and re-ingested.
+QDRANT_HYBRID = os.getenv("QDRANT_HYBRID", "0") == "1"
+DENSE_VECTOR = "dense"
+SPARSE_VECTOR = "sparse"
+
+# Payload fields we filter on
+PAYLOAD_INDEXES = {
+    "cid": PayloadSchemaType.KEYWORD,
+    "class": PayloadSchemaType.INTEGER,
+    "subject": PayloadSchemaType.KEYWORD,
+    "chapter": PayloadSchemaType.KEYWORD,
+    "chapter_number": PayloadSchemaType.INTEGER,
+    "chunk_index": PayloadSchemaType.INTEGER,
+    "lang": PayloadSchemaType.KEYWORD,
+}
+
+def quantization_config(mode: str = QDRANT_QUANTIZATION):
+    if mode == "scalar":
+        return ScalarQuantization(scalar=ScalarQuantizationConfig(
+            type=ScalarType.INT8, quantile=0.99, always_ram=QDRANT_QUANTIZATION_ALWAYS_RAM,
+        ))
+    if mode == "binary":
+        return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=QDRANT_QUANTIZATION_ALWAYS_RAM))
+    return None
+
+def search_params(mode: str = QDRANT_QUANTIZATION, rescore: bool = QDRANT_SEARCH_RESCORE,
+                  oversampling: float = QDRANT_SEARCH_OVERSAMPLING):
+    """
+    Search params for queries against the chapters collection: with quantization on, fetch
+    `oversampling` x limit candidates from the quantized index and rescore them with the
+    original vectors. None when the collection isn't quantized.
+    """
+    if quantization_config(mode) is None:
+        return None
+    return SearchParams(quantization=QuantizationSearchParams(rescore=rescore, oversampling=oversampling))
+
+def _quantization_key(config):
+    # (kind, always_ram) of a quantization config, to compare the collection's with the wanted one
+    if config is None:
+        return None
+    params = getattr(config, "scalar", None) or getattr(config, "binary", None) or getattr(config, "product", None)
+    return type(config).__name__, getattr(params, "always_ram", None)
+
+_schema_ready = False
+_schema_lock = threading.Lock()
 
 def ensure_collection():
-    if COLLECTION_NAME not in [col.name for col in client.get_collections().collections]:
-        client.recreate_collection(
+    """
+    Create the collection and its payload indexes if they are missing.
+    Runs the checks once per process (from the FastAPI lifespan); later calls return immediately.
+    """
+    global _schema_ready
+    if _schema_ready:
+        return
+    with _schema_lock:
+        if _schema_ready:
+            return
+        client = registry.get_qdrant_client()
+        hnsw_config = HnswConfigDiff(m=QDRANT_HNSW_M, ef_construct=QDRANT_HNSW_EF_CONSTRUCT)
+        optimizers_config = OptimizersConfigDiff(
+            indexing_threshold=QDRANT_INDEXING_THRESHOLD,
+            memmap_threshold=QDRANT_MEMMAP_THRESHOLD,
+        )
+        if not client.collection_exists(COLLECTION_NAME):
+            dense = VectorParams(size=384, distance=Distance.COSINE, on_disk=QDRANT_ON_DISK)
+            client.create_collection(
+                collection_name=COLLECTION_NAME,
+                vectors_config={DENSE_VECTOR: dense} if QDRANT_HYBRID else dense,
+                # IDF is computed by Qdrant over the stored sparse vectors
+                sparse_vectors_config={SPARSE_VECTOR: SparseVectorParams(modifier=Modifier.IDF)} if QDRANT_HYBRID else None,
+                hnsw_config=hnsw_config,
+                optimizers_config=optimizers_config,
+                quantization_config=quantization_config(),
+            )
+            existing = {}
+            created = True
+        else:
+            created = False
+            info = client.get_collection(COLLECTION_NAME)
+            if isinstance(info.config.params.vectors, dict) != QDRANT_HYBRID:
+                raise RuntimeError(
+                    f"{COLLECTION_NAME} was created with QDRANT_HYBRID={'0' if QDRANT_HYBRID else '1'}; "
+                    "drop the collection and re-ingest to switch"
+                )
+            # Bring an existing collection in line with the current settings in one update.
+            # Qdrant moves vectors to / from disk and re-quantizes in the background.
+            diff = {}
+            current_hnsw, current_optimizers = info.config.hnsw_config, info.config.optimizer_config
+            if (current_hnsw.m, current_hnsw.ef_construct) != (hnsw_config.m, hnsw_config.ef_construct) or \
+                    (current_optimizers.indexing_threshold, current_optimizers.memmap_threshold) != \
+                    (optimizers_config.indexing_threshold, optimizers_config.memmap_threshold):
+                diff["hnsw_config"] = hnsw_config
+                diff["optimizers_config"] = optimizers_config
+            vectors = info.config.params.vectors
+            dense = vectors[DENSE_VECTOR] if QDRANT_HYBRID else vectors
+            if bool(dense.on_disk) != QDRANT_ON_DISK:
+                diff["vectors_config"] = {DENSE_VECTOR if QDRANT_HYBRID else "": VectorParamsDiff(on_disk=QDRANT_ON_DISK)}
+            wanted = quantization_config()
+            if _quantization_key(info.config.quantization_config) != _quantization_key(wanted):
+                diff["quantization_config"] = wanted if wanted is not None else Disabled.DISABLED
+            if diff:
+                print(f"🔧 Updating {COLLECTION_NAME}: {', '.join(diff)}")
+                client.update_collection(collection_name=COLLECTION_NAME, **diff)
+            existing = info.payload_schema
+        for field, schema in PAYLOAD_INDEXES.items():
+            if field not in existing:
+                client.create_payload_index(collection_name=COLLECTION_NAME, field_name=field, field_schema=schema)
+        if not created:
+            try:
+                backfill_chapter_payload()
+            except Exception as e:
+                print(f"⚠️ Chapter payload backfill failed: {e}")
+        _schema_ready = True
+
+def backfill_chapter_payload() -> int:
+    """
+    Add the chapter fields (class, subject, chapter, chapter_number) to points ingested
+    before they were written, so class / subject scopes find those chapters too.
+    chapter_exists keeps such chapters from being re-ingested, so this is the only way
+    they get the fields. Cheap when there is nothing to do (one empty scroll).
+    Returns the number of chapters updated.
+    """
+    from chapter_upserter import chapter_payload
+    from ncert_parser import get_chapter_index
+
+    client = registry.get_qdrant_client()
+    records = None
+    skipped = []
+    updated = 0
+    while True:
+        must_not = [FieldCondition(key="cid", match=MatchAny(any=skipped))] if skipped else None
+        points, _ = client.scroll(
             collection_name=COLLECTION_NAME,
-            vectors_config=VectorParams(size=384, distance=Distance.COSINE)
+            scroll_filter=Filter(must=[IsEmptyCondition(is_empty=PayloadField(key="class"))], must_not=must_not),
+            limit=1,
+            with_payload=["cid"],
         )
-    client.create_payload_index(
-        collection_name=COLLECTION_NAME,
-        field_name="cid",
-        field_schema="keyword"
-    )
+        if not points:
+            break
+        cid = points[0].payload.get("cid")
+        if records is None:
+            records = {chapter_id(r.class_num, r.subject, r.chapter): r for r in get_chapter_index().entries}
+        record = records.get(cid)
+        if record is None:
+            print(f"⚠️ No chapter index entry for {cid}; its points keep no chapter fields")
+            skipped.append(cid)
+            continue
+        client.set_payload(
+            collection_name=COLLECTION_NAME,
+            payload=chapter_payload(record),
+            points=Filter(must=[FieldCondition(key="cid", match=MatchValue(value=cid))]),
+            wait=True,
+        )
+        updated += 1
+    if updated:
+        print(f"🧩 Backfilled chapter fields for {updated} chapters")
+    return updated
 
 def chapter_id(class_num, subject, chapter):
     return f"class{class_num}_{subject.lower().strip()}_{chapter.lower().strip()}"
 
 def chapter_exists(id: str) -> bool:
-    result = client.scroll(collection_name=COLLECTION_NAME, scroll_filter={"must": [{"key": "cid", "match": {"value": id}}]}, limit=1)
+    """
+    True once a chapter was ingested completely: insert_vectors marks the last chunk with
+    chunk_count only after every point has been written. A partly uploaded chapter has no
+    marker, so the next upsert runs again and overwrites its points in place.
+    """
+    client = registry.get_qdrant_client()
+    result = client.scroll(
+        collection_name=COLLECTION_NAME,
+        scroll_filter=Filter(
+            must=[FieldCondition(key="cid", match=MatchValue(value=id))],
+            must_not=[IsEmptyCondition(is_empty=PayloadField(key="chunk_count"))],
+        ),
+        limit=1,
+    )
     return len(result[0]) > 0
 
-def insert_vectors(id: str, vectors: list[list[float]], texts: list[str]):
-    points = [
-    PointStruct(
-        id=str(uuid4()),
-        vector=vec,
-        payload={
-            "text": text,
-            "cid": id  # keep this as-is for filtering
-        }
+def point_id(cid: str, chunk_index: int) -> str:
+    # Deterministic, so re-running an ingest overwrites the same points instead of duplicating them
+    return str(uuid5(POINT_NAMESPACE, f"{cid}:{chunk_index}"))
+
+def chunk_payload(id: str, text: str, chunk_index: int, extra: dict = None) -> dict:
+    return {
+        "text": text,
+        "cid": id,  # keep this as-is for filtering
+        "chunk_index": chunk_index,
+        **(extra or {})  # extra per-chunk fields (chapter metadata, pages, lang)
+    }
+
+def insert_vectors(id: str, vectors, texts: list[str], payloads: list[dict] = None, sparse_vectors: list = None,
+                   batch_size: int = QDRANT_UPLOAD_BATCH, parallel: int = QDRANT_UPLOAD_PARALLEL,
+                   wait: bool = False, barrier: bool = True):
+    """
+    Upload one chapter's chunks in batches of `batch_size` points.
+    Vectors stay a float32 array and payloads are generated lazily, so no full list of
+    PointStructs is built. With wait=False batches are fire-and-forget; `barrier` then
+    re-sends the last point with wait=True, which returns once every earlier batch
+    has been applied. In a hybrid collection `sparse_vectors` (one per chunk) are
+    stored next to the dense ones. Points left over from an earlier ingest that produced
+    more chunks (chunk_index >= len(vectors)) are deleted afterwards, and finally the
+    last chunk gets the chunk_count completion marker (see chapter_exists).
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if not len(vectors):
+        return
+
+    def point_vector(i):
+        if not QDRANT_HYBRID:
+            return vectors[i]
+        return {DENSE_VECTOR: vectors[i].tolist(), SPARSE_VECTOR: sparse_vectors[i]}
+
+    client = registry.get_qdrant_client()
+    client.upload_collection(
+        collection_name=COLLECTION_NAME,
+        vectors=(point_vector(i) for i in range(len(vectors))) if QDRANT_HYBRID else vectors,
+        payload=(chunk_payload(id, text, i, payloads[i] if payloads else None) for i, text in enumerate(texts)),
+        ids=(point_id(id, i) for i in range(len(vectors))),
+        batch_size=batch_size,
+        parallel=parallel,
+        wait=wait,
+    )
+    if barrier and not wait:
+        last = len(vectors) - 1
+        vector = point_vector(last)
+        client.upsert(
+            collection_name=COLLECTION_NAME,
+            points=[PointStruct(
+                id=point_id(id, last),
+                vector=vector.tolist() if isinstance(vector, np.ndarray) else vector,
+                payload=chunk_payload(id, texts[last], last, payloads[last] if payloads else None),
+            )],
+            wait=True,
+        )
+    delete_stale_chunks(id, len(vectors), wait=wait or barrier)
+    # Only reached when everything above succeeded (the upserts replaced any old marker)
+    client.set_payload(
+        collection_name=COLLECTION_NAME,
+        payload={"chunk_count": len(vectors)},
+        points=[point_id(id, len(vectors) - 1)],
+        wait=wait or barrier,
+    )
+
+def delete_stale_chunks(id: str, n_chunks: int, wait: bool = True):
+    """
+    Point ids are uuid5(cid:i), so a re-ingest overwrites chunks 0..n-1 in place but
+    never touches a longer previous version's tail; drop those points here.
+    """
+    registry.get_qdrant_client().delete(
+        collection_name=COLLECTION_NAME,
+        points_selector=FilterSelector(filter=Filter(must=[
+            FieldCondition(key="cid", match=MatchValue(value=id)),
+            FieldCondition(key="chunk_index", range=Range(gte=n_chunks)),
+        ])),
+        wait=wait,
     )
-    for vec, text in zip(vectors, texts)
-]
-    client.upsert(collection_name=COLLECTION_NAME, points=points)
@@ -0,0 +1,212 @@
+import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+# Heavy client libraries are imported inside the factories below, so importing the
+# registry (and main) stays cheap and the cost moves to the background warm-up.
+if TYPE_CHECKING:
+    from qdrant_client import QdrantClient, AsyncQdrantClient
+    from langchain_groq import ChatGroq
+    from embedder import LocalMiniLMEmbedder
+    from jobs import JobQueue
+    from sparse_encoder import BM25SparseEncoder
+    from yt_search import YouTubeSearch
+    from chapter_videos import ChapterVideoStore
+
+QDRANT_URL = os.getenv("QDRANT_URL")
+QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
+GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+QDRANT_POOL_SIZE = int(os.getenv("QDRANT_POOL_SIZE", "32"))
+QDRANT_TIMEOUT = int(os.getenv("QDRANT_TIMEOUT", "30"))
+# Concurrency limits for the async chat pipeline
+EMBED_MAX_WORKERS = int(os.getenv("EMBED_MAX_WORKERS", "4"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "256"))
+
+# Process-wide components, created once and shared by every request.
+_components = {}
+_lock = threading.RLock()  # guards _components and _key_locks; never held while building
+_key_locks = {}
+
+
+def _key_lock(key) -> threading.RLock:
+    with _lock:
+        lock = _key_locks.get(key)
+        if lock is None:
+            lock = _key_locks[key] = threading.RLock()
+        return lock
+
+
+def get_or_create(key, factory):
+    """
+    Return the component registered under `key`, building it with `factory()`
+    the first time it is asked for. Safe to call from many threads at once.
+    Each key has its own build lock, so a slow build (e.g. the embedder during the
+    warm-up) only blocks callers waiting for that same component. Those callers still
+    block their thread, so async code must not make a first call on the event loop
+    (see main.chat_module).
+    """
+    component = _components.get(key)
+    if component is None:
+        with _key_lock(key):
+            component = _components.get(key)
+            if component is None:
+                component = factory()
+                with _lock:
+                    _components[key] = component
+    return component
+
+
+def get_embedder() -> "LocalMiniLMEmbedder":
+    def build():
+        from embedder import LocalMiniLMEmbedder
+        return LocalMiniLMEmbedder(executor=get_embed_executor())
+    return get_or_create("embedder", build)
+
+
+def get_sparse_encoder() -> "BM25SparseEncoder":
+    def build():
+        from sparse_encoder import BM25SparseEncoder
+        return BM25SparseEncoder()
+    return get_or_create("sparse_encoder", build)
+
+
+def _qdrant_client_kwargs() -> dict:
+    import httpx
+    return dict(
+        url=QDRANT_URL,
+        api_key=QDRANT_API_KEY,
+        timeout=QDRANT_TIMEOUT,
+        limits=httpx.Limits(
+            max_connections=QDRANT_POOL_SIZE,
+            max_keepalive_connections=QDRANT_POOL_SIZE,
+        ),
+    )
+
+
+def get_qdrant_client() -> "QdrantClient":
+    def build():
+        from qdrant_client import QdrantClient
+        return QdrantClient(**_qdrant_client_kwargs())
+    return get_or_create("qdrant_client", build)
+
+
+def get_async_qdrant_client() -> "AsyncQdrantClient":
+    def build():
+        from qdrant_client import AsyncQdrantClient
+        return AsyncQdrantClient(**_qdrant_client_kwargs())
+    return get_or_create("async_qdrant_client", build)
+
+
+def get_embed_executor() -> ThreadPoolExecutor:
+    # Bounded pool for CPU-bound embedding calls made from async code
+    return get_or_create("embed_executor", lambda: ThreadPoolExecutor(
+        max_workers=EMBED_MAX_WORKERS,
+        thread_name_prefix="embed",
+    ))
+
+
+def get_llm_semaphore() -> asyncio.Semaphore:
+    # Caps the number of LLM calls in flight per process
+    return get_or_create("llm_semaphore", lambda: asyncio.Semaphore(LLM_MAX_CONCURRENCY))
+
+
+async def aembed_query(text: str) -> list[float]:
+    return await get_embedder().aembed_query(text)
+
+
+def get_answer_cache():
+    # None when ANSWER_CACHE_BACKEND=off
+    import answer_cache
+    if answer_cache.ANSWER_CACHE_BACKEND not in ("local", "qdrant"):
+        return None
+    return get_or_create("answer_cache", lambda: answer_cache.create_answer_cache(
+        get_qdrant_client,
+        dim=get_embedder().model.get_sentence_embedding_dimension(),
+    ))
+
+
+def get_job_queue() -> "JobQueue":
+    # Background work (chapter upserts) that shouldn't hold a request open
+    def build():
+        from jobs import JobQueue
+        return JobQueue()
+    return get_or_create("job_queue", build)
+
+
+def get_reranker():
+    # None unless RERANK_ENABLED=1
+    import reranker
+    if not reranker.RERANK_ENABLED:
+        return None
+    return get_or_create("reranker", reranker.CrossEncoderReranker)
+
+
+def get_youtube_search() -> "YouTubeSearch":
+    # Pooled YouTube API client plus its search / video caches
+    def build():
+        from yt_search import create_youtube_search
+        return create_youtube_search()
+    return get_or_create("youtube_search", build)
+
+
+def get_chapter_videos() -> "ChapterVideoStore":
+    # Precomputed per-chapter videos, loaded into memory once; refreshed in the background if enabled
+    def build():
+        import chapter_videos
+        store = chapter_videos.ChapterVideoStore()
+        if chapter_videos.CHAPTER_VIDEOS_REFRESH_HOURS > 0:
+            store.start_refresher()
+        return store
+    return get_or_create("chapter_videos", build)
+
+
+def get_llm(model_name: str = "groq/compound") -> "ChatGroq":
+    def build():
+        from langchain_groq import ChatGroq
+        return ChatGroq(groq_api_key=GROQ_API_KEY, model_name=model_name)
+    return get_or_create(("llm", model_name), build)
+
+
+def warm_up():
+    """
+    Build the heavy components up front (called from the FastAPI lifespan hook)
+    so the first request doesn't pay for model loading.
+    """
+    embedder = get_embedder()
+    embedder.embed_query("warm up")
+    get_qdrant_client()
+    get_async_qdrant_client()
+    get_embed_executor()
+    get_answer_cache()
+    get_reranker()
+    get_youtube_search()
+    get_chapter_videos()
+    get_llm()
+
+
+async def aclose():
+    with _lock:
+        client = _components.pop("qdrant_client", None)
+        if client is not None:
+            client.close()
+        async_client = _components.pop("async_qdrant_client", None)
+        embedder = _components.pop("embedder", None)
+        if embedder is not None:
+            embedder.close()
+        chapter_videos = _components.pop("chapter_videos", None)
+        if chapter_videos is not None:
+            chapter_videos.close()
+        youtube_search = _components.pop("youtube_search", None)
+        if youtube_search is not None:
+            youtube_search.close()
+        job_queue = _components.pop("job_queue", None)
+        if job_queue is not None:
+            job_queue.shutdown()
+        executor = _components.pop("embed_executor", None)
+        if executor is not None:
+            executor.shutdown(wait=False)
+        _components.clear()
+    if async_client is not None:
+        await async_client.close()
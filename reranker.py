@@ -0,0 +1,89 @@
+import asyncio
+import os
+import threading
+import time
+
+from langchain_core.documents import Document
+
+# Off by default: the cross-encoder is a second model to download and hold in memory
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "0") == "1"
+# Multilingual, like the embedder: questions and chapters come in Hindi and other languages too
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+# Candidates fetched from Qdrant and scored in one cross-encoder batch
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "12"))
+# Chunks scoring below RERANK_THRESHOLD (0-1) are dropped; if none pass, the answer is "not available"
+RERANK_THRESHOLD = float(os.getenv("RERANK_THRESHOLD", "0.3"))
+RERANK_MAX_KEEP = int(os.getenv("RERANK_MAX_KEEP", "5"))
+# Also drop chunks scoring below this fraction of the best one, so confident queries keep 1-2 chunks
+RERANK_RELATIVE = float(os.getenv("RERANK_RELATIVE", "0.5"))
+
+
+class CrossEncoderReranker:
+    def __init__(self, model_name: str = RERANK_MODEL, threshold: float = RERANK_THRESHOLD,
+                 max_keep: int = RERANK_MAX_KEEP, relative: float = RERANK_RELATIVE):
+        from sentence_transformers import CrossEncoder  # loads torch; only when reranking is on
+        self.model = CrossEncoder(model_name)
+        self.threshold = threshold
+        self.max_keep = max_keep
+        self.relative = relative
+
+        self._stats_lock = threading.Lock()
+        self._calls = 0
+        self._candidates = 0
+        self._kept = 0
+        self._empty = 0
+        self._total_time = 0.0
+        self._max_time = 0.0
+        self._last_time = 0.0
+
+    def select(self, docs: list[Document], scores) -> list[Document]:
+        """Keep the best-scoring docs above the absolute and relative thresholds."""
+        ranked = sorted(zip(scores, docs), key=lambda pair: pair[0], reverse=True)
+        if not ranked or ranked[0][0] < self.threshold:
+            return []
+        cutoff = max(self.threshold, ranked[0][0] * self.relative)
+        kept = []
+        for score, doc in ranked[:self.max_keep]:
+            if score < cutoff:
+                break
+            doc.metadata["rerank_score"] = round(float(score), 4)
+            kept.append(doc)
+        return kept
+
+    def rerank(self, query: str, docs: list[Document]) -> list[Document]:
+        if not docs:
+            return []
+        started = time.perf_counter()
+        # one batch for all candidates; single-label models return sigmoid scores in 0-1
+        scores = self.model.predict([(query, doc.page_content) for doc in docs], show_progress_bar=False)
+        kept = self.select(docs, scores)
+        elapsed = time.perf_counter() - started
+
+        with self._stats_lock:
+            self._calls += 1
+            self._candidates += len(docs)
+            self._kept += len(kept)
+            self._empty += not kept
+            self._total_time += elapsed
+            self._max_time = max(self._max_time, elapsed)
+            self._last_time = elapsed
+        print(f"🔀 Reranked {len(docs)} candidates in {elapsed * 1000:.1f} ms, kept {len(kept)}")
+        return kept
+
+    async def arerank(self, query: str, docs: list[Document], executor=None) -> list[Document]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, self.rerank, query, docs)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "calls": self._calls,
+                "avg_candidates": round(self._candidates / self._calls, 2) if self._calls else 0.0,
+                "avg_kept": round(self._kept / self._calls, 2) if self._calls else 0.0,
+                "not_available": self._empty,
+                "avg_ms": round(1000 * self._total_time / self._calls, 3) if self._calls else 0.0,
+                "max_ms": round(1000 * self._max_time, 3),
+                "last_ms": round(1000 * self._last_time, 3),
+                "threshold": self.threshold,
+                "max_keep": self.max_keep,
+            }
@@ -0,0 +1,155 @@
+import os
+
+import numpy as np
+from langchain_core.documents import Document
+from qdrant_client.http.models import Filter, FieldCondition, MatchValue, MatchAny, Prefetch, FusionQuery, Fusion
+import registry
+from ncert_parser import get_chapter_index
+from qdrant_utils import DENSE_VECTOR, QDRANT_HYBRID, SPARSE_VECTOR, search_params
+
+COLLECTION_NAME = os.getenv("QDRANT_COLLECTION_NAME")
+
+
+def single_cid(scope):
+    """The cid when `scope` names exactly one chapter, else None."""
+    if isinstance(scope, str):
+        return scope
+    cids = (scope or {}).get("cids") or []
+    if len(cids) == 1 and not scope.get("class_num") and not scope.get("subject"):
+        return cids[0]
+    return None
+
+
+def scope_key(scope) -> str:
+    # stable string for a scope, used to cache per-scope retrievers
+    if isinstance(scope, str):
+        return scope
+    return "|".join(f"{key}={scope[key]}" for key in sorted(scope) if scope[key] not in (None, [], ""))
+
+
+def scope_filter(scope, lang: str = None) -> Filter:
+    """
+    Qdrant filter for a retrieval scope. `scope` is either a cid or a dict with any of
+      "cids":      list of cids (one or more chapters)
+      "class_num": a whole class
+      "subject":   a whole subject (within class_num when given; "english" matches every English book)
+    Wide scopes rely on the class / subject payload indexes created by ensure_collection.
+    """
+    if isinstance(scope, str):
+        scope = {"cids": [scope]}
+    must = []
+    cids = scope.get("cids")
+    if cids:
+        must.append(FieldCondition(key="cid", match=MatchValue(value=cids[0]) if len(cids) == 1 else MatchAny(any=cids)))
+    class_num = scope.get("class_num")
+    if class_num is not None:
+        must.append(FieldCondition(key="class", match=MatchValue(value=class_num)))
+    subject = scope.get("subject")
+    if subject:
+        subjects = get_chapter_index().resolve_subjects(class_num, subject) if class_num is not None else []
+        subjects = subjects or [subject.lower().strip()]
+        must.append(FieldCondition(key="subject", match=MatchAny(any=subjects)))
+    if not must:
+        raise ValueError("Retrieval scope needs at least one of cids, class_num or subject")
+    if lang:
+        # only chunks ingested with EMBED_DETECT_LANG carry a `lang` payload
+        must.append(FieldCondition(key="lang", match=MatchValue(value=lang)))
+    return Filter(must=must)
+
+
+def cid_filter(cid: str, lang: str = None) -> Filter:
+    return scope_filter(cid, lang)
+
+
+def maximal_marginal_relevance(query_vector, candidate_vectors, k: int = 5, lambda_mult: float = 0.5,
+                               relevance=None) -> list[int]:
+    """
+    Pick `k` candidate indices balancing similarity to the query against
+    similarity to the candidates already picked (same as langchain's MMR).
+    `relevance` replaces the query similarity, e.g. with fused hybrid scores.
+    """
+    if not candidate_vectors:
+        return []
+    query = np.asarray(query_vector, dtype=np.float32)
+    candidates = np.asarray(candidate_vectors, dtype=np.float32)
+    query = query / (np.linalg.norm(query) or 1.0)
+    candidates = candidates / np.maximum(np.linalg.norm(candidates, axis=1, keepdims=True), 1e-12)
+
+    query_sim = candidates @ query
+    if relevance is not None:
+        relevance = np.asarray(relevance, dtype=np.float32)
+        query_sim = relevance / (relevance.max() or 1.0)
+    selected = [int(np.argmax(query_sim))]
+    while len(selected) < min(k, len(candidates)):
+        redundancy = (candidates @ candidates[selected].T).max(axis=1)
+        scores = lambda_mult * query_sim - (1 - lambda_mult) * redundancy
+        scores[selected] = -np.inf
+        selected.append(int(np.argmax(scores)))
+    return selected
+
+
+def point_to_document(point, collection_name: str = COLLECTION_NAME) -> Document:
+    payload = dict(point.payload or {})
+    text = payload.pop("text", "")
+    metadata = {**payload, "_id": point.id, "_collection_name": collection_name}
+    return Document(page_content=text, metadata=metadata)
+
+
+def candidate_query(query: str, query_vector, scope, lang: str = None, fetch_k: int = 20,
+                    hybrid: bool = QDRANT_HYBRID) -> dict:
+    """
+    query_points arguments for the candidate fetch: a dense search, or (hybrid) dense and
+    BM25 sparse prefetches fused with RRF on the Qdrant side in the same request.
+    """
+    query_filter = scope_filter(scope, lang)
+    if not hybrid:
+        return dict(query=query_vector, query_filter=query_filter, limit=fetch_k,
+                    search_params=search_params(), with_payload=True, with_vectors=True)
+    return dict(
+        prefetch=[
+            Prefetch(query=query_vector, using=DENSE_VECTOR, filter=query_filter, limit=fetch_k, params=search_params()),
+            Prefetch(query=registry.get_sparse_encoder().encode_query(query), using=SPARSE_VECTOR,
+                     filter=query_filter, limit=fetch_k),
+        ],
+        query=FusionQuery(fusion=Fusion.RRF),
+        limit=fetch_k,
+        with_payload=True,
+        with_vectors=[DENSE_VECTOR],
+    )
+
+
+def select_documents(points, query_vector, k: int, lambda_mult: float, hybrid: bool = QDRANT_HYBRID) -> list[Document]:
+    vectors = [p.vector[DENSE_VECTOR] if isinstance(p.vector, dict) else p.vector for p in points]
+    # fused results are ranked by RRF score, which MMR then diversifies
+    relevance = [p.score for p in points] if hybrid else None
+    selected = maximal_marginal_relevance(query_vector, vectors, k=k, lambda_mult=lambda_mult, relevance=relevance)
+    return [point_to_document(points[i]) for i in selected]
+
+
+def retrieve(query: str, scope, k: int = 5, fetch_k: int = 20, lambda_mult: float = 0.5, lang: str = None,
+             query_vector: list[float] = None) -> list[Document]:
+    """Sync twin of aretrieve (used by run_chatbot)."""
+    if query_vector is None:
+        query_vector = registry.get_embedder().embed_query(query)
+    response = registry.get_qdrant_client().query_points(
+        collection_name=COLLECTION_NAME,
+        **candidate_query(query, query_vector, scope, lang, fetch_k),
+    )
+    return select_documents(response.points, query_vector, k, lambda_mult)
+
+
+async def aretrieve(query: str, scope, k: int = 5, fetch_k: int = 20, lambda_mult: float = 0.5, lang: str = None,
+                    query_vector: list[float] = None) -> list[Document]:
+    """
+    Async MMR retrieval restricted to `scope` (a cid or a scope dict, see scope_filter):
+    embed the query off the event loop, fetch `fetch_k` candidates with their vectors
+    (dense, or dense + sparse fused with RRF when QDRANT_HYBRID=1), then keep `k` diverse ones.
+    """
+    if query_vector is None:
+        query_vector = await registry.aembed_query(query)
+    client = registry.get_async_qdrant_client()
+    response = await client.query_points(
+        collection_name=COLLECTION_NAME,
+        **candidate_query(query, query_vector, scope, lang, fetch_k),
+    )
+    return select_documents(response.points, query_vector, k, lambda_mult)
@@ -0,0 +1,62 @@
+"""
+Local BM25-style sparse vectors for hybrid retrieval.
+
+Tokens are hashed (crc32) straight to sparse indices, so there is no vocabulary to build
+or ship. Documents get BM25 term-frequency weights; the IDF part is applied by Qdrant
+(the "sparse" vector is created with Modifier.IDF), and queries weigh every term 1.0.
+"""
+import os
+import re
+import zlib
+from collections import Counter
+
+from qdrant_client.http.models import SparseVector
+
+# BM25 parameters; SPARSE_AVG_DOC_LEN is roughly the token count of a 1000-char chunk
+SPARSE_K1 = float(os.getenv("SPARSE_K1", "1.2"))
+SPARSE_B = float(os.getenv("SPARSE_B", "0.75"))
+SPARSE_AVG_DOC_LEN = float(os.getenv("SPARSE_AVG_DOC_LEN", "170"))
+
+# Words (Latin or Devanagari, including vowel signs) and dotted numbers such as "6.3" in "Fig. 6.3"
+TOKEN_RE = re.compile(r"\d+(?:\.\d+)+|[0-9a-zऀ-ॣ०-ॿ]+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were "
+    "what which who why how when where with do does did can".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+def token_index(token: str) -> int:
+    return zlib.crc32(token.encode("utf-8"))
+
+
+class BM25SparseEncoder:
+    def __init__(self, k1: float = SPARSE_K1, b: float = SPARSE_B, avg_doc_len: float = SPARSE_AVG_DOC_LEN):
+        self.k1 = k1
+        self.b = b
+        self.avg_doc_len = avg_doc_len
+
+    @staticmethod
+    def _vector(weights: dict[int, float]) -> SparseVector:
+        indices = sorted(weights)
+        return SparseVector(indices=indices, values=[weights[i] for i in indices])
+
+    def encode_document(self, text: str) -> SparseVector:
+        tokens = tokenize(text)
+        norm = self.k1 * (1 - self.b + self.b * len(tokens) / self.avg_doc_len)
+        weights = {}
+        for token, tf in Counter(tokens).items():
+            # crc32 collisions are rare at chunk scale; summing keeps them harmless
+            index = token_index(token)
+            weights[index] = weights.get(index, 0.0) + tf * (self.k1 + 1) / (tf + norm)
+        return self._vector(weights)
+
+    def encode_documents(self, texts: list[str]) -> list[SparseVector]:
+        return [self.encode_document(text) for text in texts]
+
+    def encode_query(self, text: str) -> SparseVector:
+        return self._vector({token_index(token): 1.0 for token in set(tokenize(text))})
@@ -0,0 +1,99 @@
+"""
+Background warm-up and readiness for the API process.
+
+main.py imports only FastAPI, registry (which builds everything lazily) and this module.
+The heavy modules (torch via the embedder, fitz, qdrant_client, langchain_groq, the
+chapter index) are imported by the routes that need them, and warmed here in a background
+thread after the server starts listening.
+/healthz answers as soon as the process is up, /readyz once the warm-up has finished.
+
+With STARTUP_PROFILE=1 every warm-up step and the first request to each route are
+timed, printed and served at /startup-profile.
+"""
+import importlib
+import os
+import threading
+import time
+
+STARTUP_PROFILE = os.getenv("STARTUP_PROFILE", "0") == "1"
+PROCESS_STARTED = time.perf_counter()
+# On shutdown, how long to wait for a running warm-up step before closing the components
+STARTUP_SHUTDOWN_TIMEOUT = float(os.getenv("STARTUP_SHUTDOWN_TIMEOUT", "30"))
+
+# Modules behind the routes, in the order they are warmed
+WARMUP_MODULES = ["registry", "ncert_parser", "chapter_upserter", "chat_ncert", "bulk_ingest", "yt_search", "chapter_videos", "chat_title"]
+
+
+class StartupState:
+    def __init__(self):
+        self.ready = False
+        self.error = None
+        self.stage = "starting"
+        self.timings = {}  # warm-up step -> seconds
+        self.first_requests = {}  # route path -> seconds
+        self.ready_after = None
+        self._lock = threading.Lock()
+        self.cancelled = threading.Event()
+
+    def timed(self, name: str, fn):
+        if self.cancelled.is_set():
+            raise RuntimeError("warm-up cancelled by shutdown")
+        self.stage = name
+        started = time.perf_counter()
+        try:
+            return fn()
+        finally:
+            self.timings[name] = round(time.perf_counter() - started, 3)
+            if STARTUP_PROFILE:
+                print(f"⏱️ {name}: {self.timings[name]:.3f}s")
+
+    def record_first_request(self, path: str, seconds: float):
+        with self._lock:
+            if path in self.first_requests:
+                return
+            self.first_requests[path] = round(seconds, 3)
+        print(f"⏱️ first {path}: {seconds:.3f}s")
+
+    def as_dict(self) -> dict:
+        return {
+            "ready": self.ready,
+            "stage": self.stage,
+            "error": self.error,
+            "ready_after_seconds": self.ready_after,
+            "warmup_seconds": dict(self.timings),
+            "first_requests_seconds": dict(self.first_requests),
+        }
+
+
+state = StartupState()
+
+
+def warm_up():
+    """
+    Import the route modules and build the shared components (runs in a worker thread).
+    Requests that arrive earlier still work; they just build what they need themselves.
+    """
+    try:
+        for name in WARMUP_MODULES:
+            state.timed(f"import {name}", lambda: importlib.import_module(name))
+
+        import registry
+        from ncert_parser import get_chapter_index
+        from qdrant_utils import ensure_collection
+
+        state.timed("registry.warm_up", registry.warm_up)
+        state.timed("chapter index", get_chapter_index)
+        try:
+            # one-time schema setup; upserts retry it if Qdrant isn't reachable yet
+            state.timed("ensure_collection", ensure_collection)
+        except Exception as e:
+            print(f"⚠️ Could not prepare Qdrant collection at startup: {e}")
+        state.ready = True
+        state.stage = "ready"
+    except Exception as e:
+        state.error = str(e)
+        state.stage = "failed"
+        print(f"❌ Warm-up failed: {e}")
+    finally:
+        state.ready_after = round(time.perf_counter() - PROCESS_STARTED, 3)
+        print(f"{'✅' if state.ready else '⚠️'} Warm-up finished {state.ready_after:.3f}s after process start")
@@ -0,0 +1,66 @@
+import asyncio
+import time
+
+import pytest
+
+import bulk_ingest
+
+
+@pytest.fixture
+def fake_runs(monkeypatch):
+    # jobs run until their `release` event is set, instead of ingesting anything
+    async def run(self):
+        self.status = "running"
+        await self.release.wait()
+        self.status = "completed"
+        self.finished_at = time.time()
+
+    original_init = bulk_ingest.BulkIngestJob.__init__
+
+    def init(self, *args, **kwargs):
+        original_init(self, *args, **kwargs)
+        self.release = asyncio.Event()
+
+    monkeypatch.setattr(bulk_ingest.BulkIngestJob, "__init__", init)
+    monkeypatch.setattr(bulk_ingest.BulkIngestJob, "run", run)
+    monkeypatch.setattr(bulk_ingest, "bulk_jobs", {})
+    monkeypatch.setattr(bulk_ingest, "_bulk_inflight", {})
+
+
+def test_same_filter_shares_the_running_job(fake_runs):
+    async def scenario():
+        first, coalesced_first = bulk_ingest.start_bulk_ingest(10, "science")
+        second, coalesced_second = bulk_ingest.start_bulk_ingest(10, " Science ")
+        other, coalesced_other = bulk_ingest.start_bulk_ingest(9, "science")
+        assert (second is first, coalesced_first, coalesced_second, coalesced_other) == (True, False, True, False)
+        assert other is not first
+
+        first.release.set()
+        other.release.set()
+        await asyncio.gather(first.task, other.task)
+        await asyncio.sleep(0)
+        again, coalesced = bulk_ingest.start_bulk_ingest(10, "science")
+        again.release.set()
+        await again.task
+        return first, again, coalesced
+
+    first, again, coalesced = asyncio.run(scenario())
+    assert again is not first and not coalesced
+
+
+def test_finished_jobs_are_evicted(fake_runs):
+    async def scenario():
+        jobs = []
+        for class_num in (6, 7, 8):
+            job, _ = bulk_ingest.start_bulk_ingest(class_num, None)
+            job.release.set()
+            await job.task
+            jobs.append(job)
+        return jobs
+
+    old, middle, new = asyncio.run(scenario())
+    old.finished_at -= 10
+    bulk_ingest.evict_bulk_jobs(retention=5, max_finished=10)
+    assert set(bulk_ingest.bulk_jobs) == {middle.id, new.id}
+    bulk_ingest.evict_bulk_jobs(retention=60, max_finished=1)
+    assert set(bulk_ingest.bulk_jobs) == {new.id}
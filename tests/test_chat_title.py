@@ -0,0 +1,119 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import chat_title
+import registry
+
+
+class FakeLLM:
+    def __init__(self, content: str = "plain answer"):
+        self.content = content
+        self.calls = 0
+
+    def invoke(self, prompt):
+        self.calls += 1
+        return SimpleNamespace(content=self.content)
+
+    async def ainvoke(self, prompt):
+        return self.invoke(prompt)
+
+
+class BadRequest(Exception):
+    status_code = 400
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+
+class FailingStructuredLLM:
+    def __init__(self, error=None):
+        self.calls = 0
+        self.error = error or BadRequest("json mode not supported")
+
+    def invoke(self, prompt):
+        self.calls += 1
+        raise self.error
+
+    async def ainvoke(self, prompt):
+        return self.invoke(prompt)
+
+
+class StructuredLLM:
+    def invoke(self, prompt):
+        assert "JSON" in prompt
+        return chat_title.ChatTurn(answer=" structured answer ", title="Photosynthesis in Plants")
+
+    async def ainvoke(self, prompt):
+        return self.invoke(prompt)
+
+
+@pytest.fixture
+def inline_mode(monkeypatch):
+    monkeypatch.setattr(chat_title, "CHAT_TITLE_MODE", "inline")
+    monkeypatch.setattr(chat_title, "CHAT_TITLE_INLINE_MODEL", "json-model")
+    chat_title._inline_failed.clear()
+    registry._components.pop("chat_turn_llm", None)
+    registry._components.pop("title_cache", None)
+    yield
+    chat_title._inline_failed.clear()
+    registry._components.pop("chat_turn_llm", None)
+    registry._components.pop("title_cache", None)
+
+
+def test_inline_answer_and_title_in_one_call(inline_mode):
+    registry._components["chat_turn_llm"] = StructuredLLM()
+    llm = FakeLLM()
+    assert chat_title.answer_with_title(llm, "prompt", with_title=True) == ("structured answer", "Photosynthesis in Plants")
+    assert llm.calls == 0
+
+
+def test_structured_failure_falls_back_and_disables_inline(inline_mode):
+    structured = FailingStructuredLLM()
+    registry._components["chat_turn_llm"] = structured
+    llm = FakeLLM()
+
+    assert chat_title.answer_with_title(llm, "prompt", with_title=True) == ("plain answer", None)
+    assert (structured.calls, llm.calls) == (1, 1)
+
+    # later first turns skip the structured call entirely
+    assert asyncio.run(chat_title.aanswer_with_title(llm, "prompt", with_title=True)) == ("plain answer", None)
+    assert (structured.calls, llm.calls) == (1, 2)
+    assert not chat_title.inline_enabled()
+
+
+def test_output_parser_error_also_disables_inline(inline_mode):
+    from langchain_core.exceptions import OutputParserException
+    registry._components["chat_turn_llm"] = FailingStructuredLLM(OutputParserException("not JSON"))
+    assert chat_title.answer_with_title(FakeLLM(), "prompt", with_title=True) == ("plain answer", None)
+    assert not chat_title.inline_enabled()
+
+
+def test_transient_error_is_raised_without_resending_or_disabling(inline_mode):
+    structured = FailingStructuredLLM(RateLimited("429 too many requests"))
+    registry._components["chat_turn_llm"] = structured
+    llm = FakeLLM()
+
+    with pytest.raises(RateLimited):
+        chat_title.answer_with_title(llm, "prompt", with_title=True)
+    assert (structured.calls, llm.calls) == (1, 0)
+    assert chat_title.inline_enabled()
+
+
+def test_inline_mode_without_a_model_answers_plainly(inline_mode, monkeypatch):
+    monkeypatch.setattr(chat_title, "CHAT_TITLE_INLINE_MODEL", "")
+    registry._components["chat_turn_llm"] = StructuredLLM()
+    assert chat_title.answer_with_title(FakeLLM(), "prompt", with_title=True) == ("plain answer", None)
+
+
+def test_chat_title_serves_remembered_title_without_llm(inline_mode):
+    chat_title.remember_title("What is photosynthesis?", '"Photosynthesis in Plants"')
+    assert chat_title.chat_title("what is photosynthesis", "any answer") == "Photosynthesis in Plants"
+
+
+def test_extractive_title_uses_question_keywords_and_chapter():
+    assert chat_title.extractive_title("What is photosynthesis?", "Chapter 6: Life Processes") == "Photosynthesis · Life Processes"
+    assert chat_title.extractive_title("Explain the structure of DNA") == "Structure DNA"
+    assert chat_title.extractive_title("why?") == chat_title.FALLBACK_TITLE
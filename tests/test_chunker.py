@@ -0,0 +1,40 @@
+import chunker
+
+BODY = 10.0
+HEADING = 14.0
+
+
+def line(text, size=BODY, bold=False, new_block=True):
+    return (text, size, bold, new_block)
+
+
+def test_summary_does_not_stop_at_abbreviations():
+    assert chunker.summarize("Fig. 3.2 Structure of a neuron. It has dendrites.", "3.1 Neurons") == \
+        "3.1 Neurons: Fig. 3.2 Structure of a neuron."
+    assert chunker.summarize("Metals, e.g. iron and copper, conduct heat. Non-metals do not.") == \
+        "Metals, e.g. iron and copper, conduct heat."
+    assert chunker.summarize("Refer to Table No. 4 for values. Then continue.") == "Refer to Table No. 4 for values."
+
+
+def test_short_text_before_a_heading_keeps_its_own_section():
+    body = "Plants make food using sunlight, water and carbon dioxide in their leaves. " * 4
+    pages = [
+        (1, [line("6.1 Nutrition", HEADING), line(body), line("Fig. 6.1 A leaf in sunlight")]),
+        (2, [line("6.2 Respiration", HEADING), line("Cells break down glucose to release energy. " * 6)]),
+    ]
+    chunks, payloads = chunker.chunk_pages(pages, max_chars=1000, min_chars=400)
+
+    caption = next(p for c, p in zip(chunks, payloads) if "Fig. 6.1" in c)
+    assert caption["section"] == "6.1 Nutrition"
+    assert caption["page_end"] == 1
+    respiration = payloads[-1]
+    assert respiration["section"] == "6.2 Respiration"
+    assert respiration["summary"].startswith("6.2 Respiration: Cells break down glucose")
+
+
+def test_consecutive_headings_lead_one_chunk():
+    pages = [(1, [line("Chapter 6", HEADING), line("6.1 Nutrition", HEADING), line("Plants make food. " * 20)])]
+    chunks, payloads = chunker.chunk_pages(pages)
+    assert len(chunks) == 1
+    assert payloads[0]["section"] == "6.1 Nutrition"
+    assert chunks[0].startswith("Chapter 6")
@@ -0,0 +1,69 @@
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+from embed_batcher import MicroBatcher
+
+
+def make_batcher(gate: threading.Event = None):
+    def encode(texts):
+        if gate is not None:
+            gate.wait(5)
+        return np.array([[float(len(t))] for t in texts], dtype=np.float32)
+    return MicroBatcher(encode, window_ms=1, max_batch=8)
+
+
+def test_cancelled_future_does_not_kill_the_batcher():
+    gate = threading.Event()
+    batcher = make_batcher(gate)
+    try:
+        busy = batcher.submit("busy")  # holds the thread inside encode until the gate opens
+        cancelled = batcher.submit("gone")
+        assert cancelled.cancel()
+        gate.set()
+
+        assert busy.result(timeout=5) == [4.0]
+        assert batcher.submit("after").result(timeout=5) == [5.0]
+        assert batcher._thread.is_alive()
+    finally:
+        batcher.close()
+
+
+def test_cancelled_async_wait_does_not_kill_the_batcher():
+    gate = threading.Event()
+    batcher = make_batcher(gate)
+
+    async def scenario():
+        waiter = asyncio.ensure_future(asyncio.wrap_future(batcher.submit("client went away")))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        gate.set()
+        return await asyncio.wait_for(asyncio.wrap_future(batcher.submit("next")), timeout=5)
+
+    try:
+        assert asyncio.run(scenario()) == [4.0]
+        assert batcher._thread.is_alive()
+    finally:
+        batcher.close()
+
+
+def test_encode_error_is_delivered_and_batcher_keeps_running():
+    calls = []
+
+    def encode(texts):
+        calls.append(texts)
+        if len(calls) == 1:
+            raise ValueError("model failed")
+        return np.ones((len(texts), 1), dtype=np.float32)
+
+    batcher = MicroBatcher(encode, window_ms=1)
+    try:
+        with pytest.raises(ValueError):
+            batcher.submit("first").result(timeout=5)
+        assert batcher.submit("second").result(timeout=5) == [1.0]
+    finally:
+        batcher.close()
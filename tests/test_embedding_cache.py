@@ -0,0 +1,47 @@
+import multiprocessing
+
+import numpy as np
+
+from embedding_cache import QueryEmbeddingCache
+
+
+def put_in_child(disk_dir, text):
+    cache = QueryEmbeddingCache("model", 2, disk_dir=disk_dir, disk_capacity=8)
+    cache.put(text, [2.0, 2.0])
+    cache.close()
+
+
+def test_workers_sharing_a_directory_write_separate_slots(tmp_path):
+    first = QueryEmbeddingCache("model", 2, disk_dir=str(tmp_path), disk_capacity=8)
+    second = QueryEmbeddingCache("model", 2, disk_dir=str(tmp_path), disk_capacity=8)
+    try:
+        first.put("what is photosynthesis", [1.0, 0.0])
+        second.put("define osmosis", [0.0, 1.0])
+        assert sorted(p.name for p in (tmp_path / "model-2").iterdir()) == ["slot-0", "slot-1"]
+    finally:
+        first.close()
+        second.close()
+
+    # a restarted worker takes a free slot again and serves its entries from disk
+    restarted = QueryEmbeddingCache("model", 2, disk_dir=str(tmp_path), disk_capacity=8)
+    try:
+        assert restarted.get("What is Photosynthesis?") == [1.0, 0.0]
+        assert restarted.stats()["disk_hits"] == 1
+    finally:
+        restarted.close()
+
+
+def test_another_process_does_not_overwrite_a_held_slot(tmp_path):
+    cache = QueryEmbeddingCache("model", 2, disk_dir=str(tmp_path), disk_capacity=8)
+    try:
+        cache.put("mine", [1.0, 1.0])
+        child = multiprocessing.get_context("spawn").Process(target=put_in_child, args=(str(tmp_path), "theirs"))
+        child.start()
+        child.join(30)
+        assert child.exitcode == 0
+
+        assert (tmp_path / "model-2" / "slot-1" / "keys.log").read_text().count("\n") == 1
+        assert (tmp_path / "model-2" / "slot-0" / "keys.log").read_text().count("\n") == 1
+        assert np.allclose(cache.get("mine"), [1.0, 1.0])
+    finally:
+        cache.close()
@@ -0,0 +1,19 @@
+from types import SimpleNamespace
+
+import prompt_builder
+
+
+def doc(text, chunk_index):
+    return SimpleNamespace(page_content=text, metadata={"cid": "c1", "chunk_index": chunk_index, "page_start": 3, "page_end": 3})
+
+
+def test_build_context_keeps_the_top_chunk_when_the_budget_is_exhausted():
+    docs = [doc("photosynthesis " * 400, 0), doc("osmosis " * 50, 5)]
+    text, blocks = prompt_builder.build_context(docs, max_tokens=-50)
+    assert blocks == 1
+    assert text.startswith("[Page 3]\nphotosynthesis")
+    assert prompt_builder.count_tokens(text) <= prompt_builder.PROMPT_MIN_CONTEXT_TOKENS
+
+
+def test_build_context_without_docs_is_empty():
+    assert prompt_builder.build_context([], max_tokens=0) == ("", 0)
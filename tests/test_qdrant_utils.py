@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from qdrant_client import QdrantClient
+
+import qdrant_utils
+import registry
+
+
+@pytest.fixture
+def memory_qdrant(monkeypatch):
+    client = QdrantClient(":memory:")
+    monkeypatch.setitem(registry._components, "qdrant_client", client)
+    monkeypatch.setattr(qdrant_utils, "_schema_ready", False)
+    monkeypatch.setattr(qdrant_utils, "backfill_chapter_payload", lambda: 0)
+    qdrant_utils.ensure_collection()
+    yield client
+
+
+def test_partly_uploaded_chapter_is_not_reported_as_existing(memory_qdrant, monkeypatch):
+    vectors = np.random.default_rng(0).random((5, 384), dtype=np.float32)
+    texts = [f"chunk {i}" for i in range(5)]
+
+    def fail(**kwargs):
+        raise IOError("connection reset")
+
+    with monkeypatch.context() as m:
+        m.setattr(memory_qdrant, "delete", fail)
+        with pytest.raises(IOError):
+            qdrant_utils.insert_vectors("class10_science_ch1", vectors, texts)
+    assert not qdrant_utils.chapter_exists("class10_science_ch1")
+
+    qdrant_utils.insert_vectors("class10_science_ch1", vectors, texts)
+    assert qdrant_utils.chapter_exists("class10_science_ch1")
+    points, _ = memory_qdrant.scroll(qdrant_utils.COLLECTION_NAME, limit=10)
+    assert len(points) == 5
+
+
+def test_reingest_with_fewer_chunks_keeps_the_marker_on_the_new_last_chunk(memory_qdrant):
+    vectors = np.random.default_rng(1).random((4, 384), dtype=np.float32)
+    qdrant_utils.insert_vectors("cid", vectors, ["a", "b", "c", "d"])
+    qdrant_utils.insert_vectors("cid", vectors[:2], ["a", "b"])
+
+    points, _ = memory_qdrant.scroll(qdrant_utils.COLLECTION_NAME, limit=10)
+    assert sorted((p.payload["chunk_index"], p.payload.get("chunk_count")) for p in points) == [(0, None), (1, 2)]
+    assert qdrant_utils.chapter_exists("cid")
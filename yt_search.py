@@ -1,11 +1,25 @@
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor
-from googleapiclient.discovery import build
 import os
+import threading
+import time
+
+import httpx
+
+import registry
+from embedding_cache import normalize_query
+from ttl_cache import SingleFlight, TTLCache
 
 YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY")
-YOUTUBE_API_SERVICE_NAME = "youtube"
-YOUTUBE_API_VERSION = "v3"
+YOUTUBE_API_URL = "https://www.googleapis.com/youtube/v3"
+YOUTUBE_POOL_SIZE = int(os.getenv("YOUTUBE_POOL_SIZE", "10"))
+YOUTUBE_TIMEOUT = float(os.getenv("YOUTUBE_TIMEOUT", "10"))
+# search.list costs 100 quota units, videos.list 1: search results are kept much longer than stats
+YT_SEARCH_CACHE_TTL = int(os.getenv("YT_SEARCH_CACHE_TTL", str(6 * 3600)))
+YT_SEARCH_CACHE_SIZE = int(os.getenv("YT_SEARCH_CACHE_SIZE", "2048"))
+YT_STATS_CACHE_TTL = int(os.getenv("YT_STATS_CACHE_TTL", "3600"))
+YT_STATS_CACHE_SIZE = int(os.getenv("YT_STATS_CACHE_SIZE", "20000"))
+# Serve canned results instead of calling the API (tests, local dev without a key)
+YOUTUBE_FAKE = os.getenv("YOUTUBE_FAKE", "0") == "1"
 
 def days_old(upload_date_iso):
     try:
@@ -17,13 +31,6 @@ def days_old(upload_date_iso):
 def compute_score(views, days):
     return views - (1.01 ** days)
 
-def get_video_details(youtube, video_ids):
-    response = youtube.videos().list(
-        part="snippet,statistics",
-        id=",".join(video_ids)
-    ).execute()
-    return response.get("items", [])
-
 def process_video(item):
     try:
         snippet = item["snippet"]
@@ -45,31 +52,140 @@ def process_video(item):
     except:
         return None
 
-def get_top_videos(query: str, limit: int = 6, top_n: int = 3):
-    youtube = build(YOUTUBE_API_SERVICE_NAME, YOUTUBE_API_VERSION, developerKey=YOUTUBE_API_KEY)
 
-    # Step 1: Search for videos
-    search_response = youtube.search().list(
-        q=query,
-        part="id",
-        type="video",
-        maxResults=limit
-    ).execute()
+class YouTubeAPI:
+    """
+    The two YouTube Data API v3 calls we make, over one pooled keep-alive connection.
+    Calls the REST endpoints directly: no discovery document, and unlike the httplib2
+    transport of googleapiclient the client is safe to share between threads.
+    """
+
+    def __init__(self, api_key: str = YOUTUBE_API_KEY, pool_size: int = YOUTUBE_POOL_SIZE, timeout: float = YOUTUBE_TIMEOUT):
+        self.api_key = api_key
+        self.client = httpx.Client(
+            base_url=YOUTUBE_API_URL,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+
+    def _get(self, path: str, **params) -> dict:
+        response = self.client.get(path, params={**params, "key": self.api_key})
+        response.raise_for_status()
+        return response.json()
+
+    def search(self, query: str, max_results: int) -> list[str]:
+        data = self._get("/search", q=query, part="id", type="video", maxResults=max_results)
+        return [item["id"]["videoId"] for item in data.get("items", [])]
+
+    def videos(self, video_ids: list[str]) -> list[dict]:
+        data = self._get("/videos", part="snippet,statistics", id=",".join(video_ids))
+        return data.get("items", [])
+
+    def close(self):
+        self.client.close()
+
+
+class FakeYouTubeAPI:
+    """
+    Stand-in for YouTubeAPI with deterministic results and call counters. `latency`
+    (seconds) simulates the network so caching and coalescing can be observed.
+    """
+
+    def __init__(self, latency: float = 0.0, results_per_query: int = 10):
+        self.latency = latency
+        self.results_per_query = results_per_query
+        self.search_calls = 0
+        self.video_calls = 0
+        self.videos_fetched = 0
+        self._lock = threading.Lock()
+
+    def search(self, query: str, max_results: int) -> list[str]:
+        with self._lock:
+            self.search_calls += 1
+        time.sleep(self.latency)
+        slug = "".join(c for c in query.lower() if c.isalnum())[:8] or "video"
+        return [f"{slug}{i:03d}" for i in range(min(max_results, self.results_per_query))]
 
-    video_ids = [item["id"]["videoId"] for item in search_response.get("items", [])]
+    def videos(self, video_ids: list[str]) -> list[dict]:
+        with self._lock:
+            self.video_calls += 1
+            self.videos_fetched += len(video_ids)
+        time.sleep(self.latency)
+        return [
+            {
+                "id": video_id,
+                "snippet": {
+                    "title": f"Video {video_id}",
+                    "channelTitle": "Fake Channel",
+                    "publishedAt": f"2024-01-{1 + sum(map(ord, video_id)) % 28:02d}T00:00:00Z",
+                },
+                "statistics": {"viewCount": str(1000 * (1 + sum(map(ord, video_id)) % 97))},
+            }
+            for video_id in video_ids
+        ]
 
-    # Step 2: Get video details
-    if not video_ids:
-        return []
+    def close(self):
+        pass
 
-    video_items = get_video_details(youtube, video_ids)
 
-    # Step 3: Process and score
-    with ThreadPoolExecutor() as executor:
-        results = list(executor.map(process_video, video_items))
+class YouTubeSearch:
+    """
+    Cached top-video search. Video ids per normalized query and per-video details
+    (snippet + statistics) are cached with separate TTLs; scores are recomputed on
+    every call. Identical concurrent queries share one set of API calls.
+    """
 
-    results = [r for r in results if r]
-    return sorted(results, key=lambda v: v['score'], reverse=True)[:top_n]
+    def __init__(self, api, search_ttl: float = YT_SEARCH_CACHE_TTL, search_size: int = YT_SEARCH_CACHE_SIZE,
+                 stats_ttl: float = YT_STATS_CACHE_TTL, stats_size: int = YT_STATS_CACHE_SIZE):
+        self.api = api
+        self.search_cache = TTLCache(search_size, search_ttl)
+        self.video_cache = TTLCache(stats_size, stats_ttl)
+        self._flights = SingleFlight()
+
+    def _video_ids(self, query: str, limit: int) -> list[str]:
+        key = (normalize_query(query), limit)
+        video_ids = self.search_cache.get(key)
+        if video_ids is None:
+            video_ids = self.api.search(query, limit)
+            self.search_cache.set(key, video_ids)
+        return video_ids
+
+    def _videos(self, video_ids: list[str]) -> list[dict]:
+        items = {video_id: self.video_cache.get(video_id) for video_id in video_ids}
+        missing = [video_id for video_id, item in items.items() if item is None]
+        if missing:
+            # one videos.list call for all ids not in the cache
+            for item in self.api.videos(missing):
+                self.video_cache.set(item["id"], item)
+                items[item["id"]] = item
+        return [item for item in items.values() if item is not None]
+
+    def _top_videos(self, query: str, limit: int, top_n: int) -> list[dict]:
+        video_ids = self._video_ids(query, limit)
+        if not video_ids:
+            return []
+        results = [r for r in map(process_video, self._videos(video_ids)) if r]
+        return sorted(results, key=lambda v: v['score'], reverse=True)[:top_n]
+
+    def top_videos(self, query: str, limit: int = 6, top_n: int = 3) -> list[dict]:
+        return self._flights.do((normalize_query(query), limit, top_n), self._top_videos, query, limit, top_n)
+
+    def stats(self) -> dict:
+        return {
+            "search_cache": self.search_cache.stats(),
+            "video_cache": self.video_cache.stats(),
+            "coalesced": self._flights.coalesced,
+        }
+
+    def close(self):
+        self.api.close()
+
+
+def create_youtube_search() -> YouTubeSearch:
+    return YouTubeSearch(FakeYouTubeAPI() if YOUTUBE_FAKE else YouTubeAPI())
+
+def get_top_videos(query: str, limit: int = 6, top_n: int = 3):
+    return registry.get_youtube_search().top_videos(query, limit, top_n)
 
 
 # CLI usage